@@ -1,11 +1,11 @@
 # Flask and related modules
-from flask import Flask, render_template, request, redirect, session, url_for, jsonify
+from flask import Flask, render_template, request, redirect, session, url_for, jsonify, make_response, send_file
 
 # Database and security modules
-import sqlite3
 import hashlib
 
 # Utility modules
+import multiprocessing
 import os
 import json
 from markupsafe import Markup
@@ -16,6 +16,14 @@ from werkzeug.utils import secure_filename
 from utils import *
 from generate import *
 from sqlQueries import *
+from database import get_connection, close_connection, init_db, get_lock_stats
+from availability import availability_index, today_day_number
+from cache import reference_cache, vehicle_cache, fragment_cache, page_cache, calendar_cache, pdf_cache
+from facets import facet_index
+from cart import get_cart_id, get_cart_items, add_cart_item, remove_cart_item, clear_cart, purge_stale_carts
+from sessions import ServerSessionInterface, session_store
+from jobs import job_queue, REPORT_KINDS, ADMIN_REPORTS, CACHED_REPORTS
+from exports import get_invoice_rows, export_invoices, export_filename, EXPORT_FORMATS
 
 # Initialize Flask application
 app = Flask(__name__)
@@ -26,6 +34,53 @@ app.config['UPLOAD_FOLDER'] = 'static/uploads/'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['ALLOWED_FILETYPES'] = {'pdf'}
 
+# Keep session data server-side (sessions.py) so the cookie only carries an opaque ID;
+# set to False to fall back to Flask's signed cookie sessions
+app.config['SERVER_SESSIONS'] = True
+
+# Page sizes for the keyset-paginated reservation tables
+app.config['DEFAULT_PAGE_SIZE'] = 5
+app.config['MAX_PAGE_SIZE'] = 100
+
+# Return each request's pooled connection once the request finishes
+app.teardown_appcontext(close_connection)
+
+if app.config['SERVER_SESSIONS']:
+    app.session_interface = ServerSessionInterface(session_store)
+
+def start_up():
+    """Migrates the database, builds the in-memory indexes and purges stale rows and files."""
+    # Switch the database to WAL mode and apply pending migrations
+    init_db()
+    with app.app_context():
+        # Build the in-memory availability index; date searches fall back to SQL if this fails
+        try:
+            availability_index.load()
+        except Exception as e:
+            print(f"Error loading availability index: {e}")
+        # Filter dropdown values and counts; loaded lazily on first use if this fails
+        try:
+            facet_index.load()
+        except Exception as e:
+            print(f"Error loading facet index: {e}")
+        # Drop carts abandoned by sessions that never checked out or logged out, and expired sessions
+        try:
+            purge_stale_carts()
+            session_store.purge_expired()
+        except Exception as e:
+            print(f"Error purging stale carts and sessions: {e}")
+        # Rendered reports are only kept until they are downloaded or a day has passed
+        try:
+            job_queue.purge_expired()
+        except Exception as e:
+            print(f"Error purging old report jobs: {e}")
+
+# Report pool workers are spawned processes that re-import the main script
+# (and so this module) before they start; they only render documents, so
+# they skip start-up. Their process name is set before that import runs.
+if multiprocessing.current_process().name == 'MainProcess':
+    start_up()
+
 # =============================
 # 1. General Utility Functions
 # =============================
@@ -38,6 +93,39 @@ def allowed_pdf(filename):
     """Check if the given filename has an allowed PDF extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_FILETYPES']
 
+def get_page_size():
+    """Read the requested page size for paginated tables, capped at MAX_PAGE_SIZE."""
+    page_size = request.values.get('page_size', app.config['DEFAULT_PAGE_SIZE'], type=int)
+    return max(1, min(page_size, app.config['MAX_PAGE_SIZE']))
+
+def next_cursor(rows, page_size):
+    """Return the keyset cursor for the page after `rows`, or None on the last page."""
+    return rows[-1][0] if len(rows) == page_size else None
+
+def page_etag(*inputs):
+    """Build an ETag from everything a page's content depends on (versions and session inputs)."""
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds this ETag, otherwise None."""
+    if request.if_none_match.contains(etag):
+        return with_etag(app.response_class(status=304), etag)
+    return None
+
+def pdf_download(data, filename, disposition='attachment'):
+    """Wrap PDF bytes in a response that opens or downloads them as `filename`."""
+    response = make_response(data)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'{disposition}; filename={filename}'
+    return response
+
+def with_etag(response, etag):
+    """Attach the ETag and ask browsers to revalidate it on every visit."""
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # ==============================================
 # 2. Authentication and User Session Management
 # ==============================================
@@ -78,16 +166,17 @@ def forgot_password():
         data = get_user(email)
         
         if data:
-            conn = sqlite3.connect(db_path)
+            conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("UPDATE Users SET Password = ? WHERE Email = ?", (hashlib.sha3_512(new_password.encode()).hexdigest(), email))
             conn.commit()
-            conn.close()
             return render_template("login.html", modal=populateErrorModal("Password successfully updated", "Success!"))
 
 @app.route("/logout", methods=['POST', 'GET'])
 def logout():
     """Log out the current user by clearing their session data."""
+    if session.get("CartID"):
+        clear_cart(session["CartID"])
     session.clear()
     return render_template("login.html")
 
@@ -101,12 +190,24 @@ def products():
     if "UserID" not in session:
         return redirect(url_for("index"))
 
+    # The unfiltered page only changes when a vehicle (catalog version) or a location (reference generation) does
+    page_key = ("products", get_catalog_version(), reference_cache.generation("Locations"), session["Usertype"] == 1) if request.method == 'GET' else None
+    if page_key:
+        etag = page_etag(*page_key)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        page = page_cache.get(page_key)
+        if page is not None:
+            return with_etag(page, etag)
+
     selected_type = request.form.get('type', '') if request.method == 'POST' else ""
     selected_make = request.form.get('make', '') if request.method == 'POST' else ""
     selected_model = request.form.get('model', '') if request.method == 'POST' else ""
     selected_drive = request.form.get('drive', '') if request.method == 'POST' else ""
     selected_transmission = request.form.get('transmission', '') if request.method == 'POST' else ""
     selected_location = request.form.get('location', '') if request.method == 'POST' else ""
+    search = request.form.get('search', '').strip() if request.method == 'POST' else ""
     
     selected_start_date = request.form.get('start_date', '') if request.method == 'POST' else ""
     if selected_start_date != "":
@@ -125,7 +226,8 @@ def products():
             selected_transmission,
             selected_location,
             start_date,
-            end_date
+            end_date,
+            search
         ) if request.method == 'POST' else get_vehicle_information()
     else:
         vehicle_data = (
@@ -135,7 +237,8 @@ def products():
                 selected_model,
                 selected_drive,
                 selected_transmission,
-                selected_location
+                selected_location,
+                search
             ) if request.method == 'POST' else get_vehicle_information()
         )
 
@@ -143,9 +246,52 @@ def products():
     options = generate_options(selected_type, selected_make, selected_model, selected_drive, selected_transmission, selected_location, vehicle_data)
 
     if session["Usertype"] == 1:
-        return render_template("products.html", vehicle_html=vehicle_html, options=options, admin=admin_nav())
+        page = render_template("products.html", vehicle_html=vehicle_html, options=options, search=search, admin=admin_nav())
+    else:
+        page = render_template("products.html", vehicle_html=vehicle_html, options=options, search=search)
+
+    if page_key:
+        page_cache.put(page_key, page)
+        return with_etag(page, etag)
+    return page
+
+@app.route("/api/vehicles/search")
+def api_vehicle_search():
+    """Return vehicles matching the search text and filters as JSON, most relevant first."""
+    if "UserID" not in session:
+        return jsonify({'error': 'Login required'}), 401
 
-    return render_template("products.html", vehicle_html=vehicle_html, options=options)
+    filters = {field: request.args.getlist(field) for field in ('type', 'make', 'model', 'drive', 'transmission', 'location')}
+    search = request.args.get('q', '')
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+
+    try:
+        if start_date != "" and end_date != "":
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").strftime("%m/%d/%Y")
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%m/%d/%Y")
+            rows = filter_vehicles_by_dates(*filters.values(), start_date, end_date, search)
+        else:
+            rows = filter_vehicles(*filters.values(), search)
+    except ValueError:
+        return jsonify({'error': 'Dates must use the YYYY-MM-DD format'}), 400
+
+    vehicles = [
+        {
+            'vehicleID': row[0],
+            'make': row[1],
+            'model': row[2],
+            'year': row[3],
+            'type': row[4],
+            'transmission': row[6],
+            'driveTrain': row[15],
+            'locationID': row[11],
+            'photo': row[10].split("ㄹ")[0],
+            'url': url_for('vehicle_page', vehicle_id=row[0])
+        }
+        for row in rows
+    ]
+    return jsonify({'vehicles': vehicles})
 
 @app.route('/vehicle/<int:vehicle_id>')
 def vehicle_page(vehicle_id):
@@ -153,6 +299,15 @@ def vehicle_page(vehicle_id):
     if "UserID" not in session:
         return redirect(url_for("index"))
     
+    # Depends on the vehicle, its reservations, its location, the admin flag and this vehicle's lines in the cart,
+    # and on the date: the calendar only blocks ranges from today onwards
+    cart_ranges = [item.day_range for item in get_cart_items(get_cart_id()) if item.vehicle_id == vehicle_id]
+    etag = page_etag("vehicle", vehicle_id, get_catalog_version(), get_reservations_version(), reference_cache.generation("Locations"),
+                     today_day_number(), session["Usertype"] == 1, cart_ranges)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
     vehicle = get_vehicle_by_id(vehicle_id)
     if not vehicle:
         return "Vehicle not found", 404
@@ -176,28 +331,11 @@ def vehicle_page(vehicle_id):
     description_section = Markup(f"<p class='card-text'>{vehicle_data['description']}</p>")
     map_section = Markup(f'<iframe src="{vehicle_data["map_embed_link"]}" width="100%" height="300" style="border:0;" allowfullscreen="" loading="lazy"></iframe>')
     
-    reserved_dates_db = get_reserved_dates(vehicle_id)
-    fixed_dates = []
-    
-    if reserved_dates_db != []:
-        for i in range(len(reserved_dates_db)):
-            start_date_str = reserved_dates_db[i][0].strip()
-            end_date_str = reserved_dates_db[i][1].strip()
-            start_date = datetime.strptime(start_date_str, "%m/%d/%Y").strftime("%Y-%m-%d")
-            end_date = datetime.strptime(end_date_str, "%m/%d/%Y").strftime("%Y-%m-%d")
-            dates = generate_dates_between(start_date, end_date)
-            fixed_dates += dates
-
-    if session["reservedCars"] != "":
-        reserved = session["reservedCars"].strip().split(";")
-        for car in reserved:
-            car = car.strip().split(",")
-            if len(car) == 3 and car[0] == str(vehicle_id):
-                dates = generate_dates_between(datetime.strptime(car[1].split(" - ")[0], "%m/%d/%Y").strftime("%Y-%m-%d"), datetime.strptime(car[1].split(" - ")[1], "%m/%d/%Y").strftime("%Y-%m-%d"))
-                fixed_dates += dates
+    # Dates already in this user's cart are blocked too
+    reserved_ranges = get_reserved_ranges(vehicle_id, cart_ranges)
     
     if session["Usertype"] == 1:
-        return render_template(
+        return with_etag(render_template(
             'product.html',
             vehicleID=vehicle[0],
             year=vehicle[3],
@@ -207,11 +345,11 @@ def vehicle_page(vehicle_id):
             features_section=features_section,
             description_section=description_section,
             map_section=map_section,
-            reserved_dates=json.dumps(fixed_dates),
+            reserved_ranges=json.dumps(reserved_ranges),
             admin=admin_nav()
-        )
+        ), etag)
     
-    return render_template(
+    return with_etag(render_template(
         'product.html',
         vehicleID=vehicle[0],
         year=vehicle[3],
@@ -221,8 +359,8 @@ def vehicle_page(vehicle_id):
         features_section=features_section,
         description_section=description_section,
         map_section=map_section,
-        reserved_dates=json.dumps(fixed_dates)
-    )
+        reserved_ranges=json.dumps(reserved_ranges)
+    ), etag)
 
 @app.route("/cart", methods=['POST', 'GET'])
 def cart():
@@ -230,18 +368,18 @@ def cart():
     if "UserID" not in session:
         return redirect(url_for("index"))
     
-    if not session.get("reservedCars"):
+    cart_items = get_cart_items(get_cart_id())
+    if not cart_items:
         if session["Usertype"] == 1:
             return render_template("shopping-cart.html", cart_html="Your cart is empty.", admin=admin_nav())
         return render_template("shopping-cart.html", cart_html="Your cart is empty.")
     
     cart_html = ""
-    reservedCars = session["reservedCars"].strip().split(";")
+    vehicles = get_cart_vehicles(cart_items)
     
-    for car in reservedCars:
-        car = car.strip().split(",")
-        if len(car) == 3:
-            vehicle = get_vehicle_by_id(car[0])
+    for item in cart_items:
+        vehicle = vehicles.get(item.vehicle_id)
+        if vehicle:
             cart_html += Markup(
                 """<tr>
                     <th scope="row" class="border-0">
@@ -256,9 +394,9 @@ def cart():
                     <td class="border-0 align-middle"><strong>{numDays}</strong></td>
                     <td class="border-0 align-middle"><a href="/remove/{ReserveID}" class="text-dark"><i class="fa fa-trash"></i></a></td>
                     </tr>"""
-            ).format(Photo=vehicle[10].split("ㄹ")[0], year=vehicle[3], make=vehicle[1], model=vehicle[2], type=vehicle[4], dates=car[1], VehicleID=vehicle[0], numDays=getNumDays(car[1])+1, ReserveID=car[2])
+            ).format(Photo=vehicle[10].split("ㄹ")[0], year=vehicle[3], make=vehicle[1], model=vehicle[2], type=vehicle[4], dates=item.daterange, VehicleID=vehicle[0], numDays=item.num_days, ReserveID=item.item_id)
             
-    checkout_html, totalData = GetCheckoutValues(reservedCars)
+    checkout_html, totalData = GetCheckoutValues(cart_items, vehicles)
     
     if session["Usertype"] == 1:
         return render_template("shopping-cart.html", cart_html=cart_html, Rates=checkout_html, subtotal=totalData[0], tax=totalData[1], total=totalData[2], admin=admin_nav())   
@@ -274,22 +412,12 @@ def addToCart():
     vehicle_id = request.form['vehicleID']
     daterange = request.form['daterange']
     
-    if "reservedCars" not in session or not session["reservedCars"]:
-        session["reservedCars"] = ""
-    
-    reserve_id = 0
-
-    if session["reservedCars"].strip() != "":
-        reserved_cars = session["reservedCars"].strip().split(";")
-        try:
-            existing_ids = [
-                int(car.strip().split(",")[2]) for car in reserved_cars if car.strip()
-            ]
-            reserve_id = max(existing_ids) + 1
-        except (ValueError, IndexError):
-            reserve_id = 0
-
-    session["reservedCars"] += f"{vehicle_id},{daterange},{reserve_id};"
+    try:
+        numdays = getNumDays(daterange) + 1
+        startdate, enddate = (part.strip() for part in daterange.split(" - "))
+        add_cart_item(get_cart_id(), int(vehicle_id), startdate, enddate, numdays)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     return redirect(url_for("products"))
 
@@ -299,18 +427,10 @@ def remove_from_cart(reserve_id):
     if "UserID" not in session:
         return redirect(url_for("index"))
     
-    if not session.get("reservedCars"):   
+    if not session.get("CartID"):
         return redirect(url_for("products"))
     
-    reservedCars = session["reservedCars"].strip().split(";")
-    newReservedCars = ""
-    
-    for car in reservedCars:
-        car = car.strip().split(",")
-        if len(car) == 3 and car[2] != str(reserve_id):
-            newReservedCars += car[0] + "," + car[1] + "," + car[2] + ";"
-    
-    session["reservedCars"] = newReservedCars
+    remove_cart_item(session["CartID"], reserve_id)
     
     if session["Usertype"] == 1:
         return redirect(url_for("cart"))
@@ -335,6 +455,26 @@ def admin():
     else:
         return redirect(url_for("products"))
 
+@app.route("/admin/metrics")
+def admin_metrics():
+    """Report internal performance counters such as database lock waits."""
+    if "UserID" not in session:
+        return redirect(url_for("index"))
+    if session["Usertype"] != 1:
+        return redirect(url_for("products"))
+
+    return jsonify({
+        'database': get_lock_stats(),
+        'reference_cache': reference_cache.stats(),
+        'vehicle_cache': vehicle_cache.stats(),
+        'fragment_cache': fragment_cache.stats(),
+        'page_cache': page_cache.stats(),
+        'calendar_cache': calendar_cache.stats(),
+        'session_cache': session_store.stats(),
+        'report_jobs': job_queue.stats(),
+        'pdf_cache': pdf_cache.stats()
+    })
+
 # =======================
 # 5. Customer Management
 # =======================
@@ -385,11 +525,10 @@ def get_customer_by_userid():
     if not user_id:
         return jsonify({'error': 'UserID is required'}), 400
 
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM Users WHERE UserID = ?", (user_id,))
     customer = cursor.fetchone()
-    conn.close()
 
     if customer:
         customer_data = {
@@ -430,11 +569,10 @@ def modify_customer():
         photo_filename = new_photo
     else:
         try:
-            conn = sqlite3.connect(db_path)
+            conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("SELECT UserPhoto FROM Users WHERE UserID = ?", (user_id,))
             current_photo = cursor.fetchone()
-            conn.close()
 
             if current_photo:
                 photo_filename = current_photo[0]
@@ -591,7 +729,8 @@ def make_reservation():
     if "UserID" not in session:
         return redirect(url_for("index"))
     
-    if not session.get("reservedCars"):
+    cart_items = get_cart_items(get_cart_id())
+    if not cart_items:
         return redirect(url_for("products"))
     
     if request.method == 'POST':
@@ -601,7 +740,6 @@ def make_reservation():
         address = request.form['address']
         dropofflocation = request.form['dropofflocation']
 
-        reservedCars = session["reservedCars"].strip().split(";")
         driversLicensePhoto = request.files['driversLicensePhoto']
         if driversLicensePhoto.filename == '':
             return jsonify({'error': 'No selected photo'}), 400
@@ -613,48 +751,36 @@ def make_reservation():
         else:
             return jsonify({'error': 'Invalid photo file format'}), 400
         
-        insert_customer_CustomerTable(name, address, phone, email, filename)
-        customerid = get_customerid_by_email(email)
+        checkout_items = []
+        vehicles = get_cart_vehicles(cart_items)
+        for item in cart_items:
+            vehicle = vehicles.get(item.vehicle_id)
+            if vehicle is None:
+                # The car was removed from the fleet after it was added to the cart
+                return jsonify({'error': f'Vehicle {item.vehicle_id} is no longer available. Remove it from your cart and try again.'}), 409
+            # Same formula as get_price_by_vehicleid, from the line total fixed when the car was added
+            priceforvehicle = (item.line_total + 30.00) * 1.07
+            planID = get_planid_by_vehicleid(item.vehicle_id)
+            location = vehicle[11]
+            checkout_items.append((item.vehicle_id, planID, item.start_date, item.end_date, item.num_days, location, priceforvehicle))
         
-        for car in reservedCars:
-            car = car.strip().split(",")
-            if len(car) == 3:
-                vehicle_id = car[0]
-                daterange = car[1]
-                startdate = datetime.strptime(daterange.split(" - ")[0], "%m/%d/%Y").strftime("%m/%d/%Y")
-                enddate = datetime.strptime(daterange.split(" - ")[1], "%m/%d/%Y").strftime("%m/%d/%Y")
-                numdays = getNumDays(daterange) + 1
-                priceforvehicle = get_price_by_vehicleid(int(vehicle_id), numdays)
-                planID = get_planid_by_vehicleid(int(vehicle_id))
-                location = get_vehicle_by_id(int(vehicle_id))[11]
-                success = make_reservation_db(int(vehicle_id), planID, customerid[0], startdate, enddate, numdays, location, dropofflocation, userID=session['UserID'], totalprice=priceforvehicle)
-                if not success:
-                    return jsonify({'error': 'Failed to make reservation'}), 500
-                
-        for car in reservedCars:
-            car = car.strip().split(",")
-            if len(car) == 3:
-                daterange = car[1]
-                startdate = datetime.strptime(daterange.split(" - ")[0], "%m/%d/%Y").strftime("%m/%d/%Y")
-                enddate = datetime.strptime(daterange.split(" - ")[1], "%m/%d/%Y").strftime("%m/%d/%Y")
-                reservationid = get_reservationid_by_customerid(customerid[0], car[0], startdate, enddate)
-                planID = get_planid_by_vehicleid(car[0])
-                success = make_invoice_db(planID, reservationid, car[0], customerid[0])
-                invoiceID = get_invoiceid_by_reservationid(reservationid)
-                update_reservation_db(reservationid, invoiceID)
-                if not success:
-                    return jsonify({'error': 'Failed to make invoice'}), 500
+        # Customer, reservations and invoices are written in a single transaction
+        try:
+            checkout_db(name, address, phone, email, filename, checkout_items, dropofflocation, userID=session['UserID'])
+        except ReservationConflict as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            return jsonify({'error': f'Failed to make reservation: {e}'}), 500
                 
-        session["reservedCars"] = ""
+        clear_cart(get_cart_id())
         return redirect(url_for("products"))
     else:
         cart = ""
-        reservedCars = session["reservedCars"].strip().split(";")
+        vehicles = get_cart_vehicles(cart_items)
         
-        for car in reservedCars:
-            car = car.strip().split(",")
-            if len(car) == 3:
-                vehicle = get_vehicle_by_id(car[0])
+        for item in cart_items:
+            vehicle = vehicles.get(item.vehicle_id)
+            if vehicle:
                 cart += Markup(
                     """<tr>
                             <th scope="row" class="border-0">
@@ -668,7 +794,7 @@ def make_reservation():
                             <td class="border-0 align-middle"><strong>{dates}</strong></td>
                             <td class="border-0 align-middle"><strong>{numDays}</strong></td>
                         </tr>"""
-                ).format(Photo=vehicle[10].split("ㄹ")[0], year=vehicle[3], make=vehicle[1], model=vehicle[2], type=vehicle[4], dates=car[1], VehicleID=vehicle[0], numDays=getNumDays(car[1])+1)
+                ).format(Photo=vehicle[10].split("ㄹ")[0], year=vehicle[3], make=vehicle[1], model=vehicle[2], type=vehicle[4], dates=item.daterange, VehicleID=vehicle[0], numDays=item.num_days)
                 
         locationOptions = get_location_options()
         locationOptions = generate_location_options(locationOptions)
@@ -683,83 +809,93 @@ def pickupdropoff():
     if "UserID" not in session:
         return redirect(url_for("index"))
     
-    pickupHTML = ""
-    dropoffHTML = ""
-    pickup_modalhtml = ""
-    dropoff_modalhtml = ""
+    # Search terms and cursors come from the search forms or the pager links
+    pickupEmail = request.values.get('pickupemail', '')
+    dropoffEmail = request.values.get('dropoffemail', '')
+    pickupBefore = request.values.get('pickup_before', type=int)
+    dropoffBefore = request.values.get('dropoff_before', type=int)
+    page_size = get_page_size()
     
-    if request.method == 'POST':
-        pickupEmail = request.form.get('pickupemail')
-        dropoffEmail = request.form.get('dropoffemail')
-        
-        if pickupEmail != "":
-            reservationsTableData = get_customer_tableData(pickupEmail)
-            for i, reservation in enumerate(reservationsTableData):
-                pickup_modalhtml += pickup_modal_html(reservation[0])
-                reservation = list(reservation)
-                email = get_emailData_by_customerid(reservation[5])
-                reservation.append(email)
-                reservationsTableData[i] = reservation
-            pickupHTML = generate_pickupdropoff_html(reservationsTableData)
-            
-            reservationsTableData = get_reservations_tableData(pickedup=True)
-            for i, reservation in enumerate(reservationsTableData):
-                dropoff_modalhtml += dropoff_modal_html(reservation[0])
-                reservation = list(reservation)
-                email = get_emailData_by_customerid(reservation[5])
-                reservation.append(email)
-                reservationsTableData[i] = reservation
-            dropoffHTML = generate_pickupdropoff_html(reservationsTableData)
-            
-            if session["Usertype"] == 1:
-                return render_template("pickup-dropoff.html", admin=admin_nav(), pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickup_modal_html=pickup_modalhtml, dropoff_modal_html=dropoff_modalhtml)
-            return render_template("pickup-dropoff.html", pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickup_modal_html=pickup_modal_html, dropoff_modal_html=dropoff_modal_html)
-            
-        elif dropoffEmail != "":
-            reservationsTableData = get_reservations_tableData()
-            for i, reservation in enumerate(reservationsTableData):
-                pickup_modalhtml += pickup_modal_html(reservation[0])
-                reservation = list(reservation)
-                email = get_emailData_by_customerid(reservation[5])
-                reservation.append(email)
-                reservationsTableData[i] = reservation
-            pickupHTML = generate_pickupdropoff_html(reservationsTableData)
-            
-            reservationsTableData = get_customer_tableData(dropoffEmail, True)
-            for i, reservation in enumerate(reservationsTableData):
-                dropoff_modalhtml += dropoff_modal_html(reservation[0])
-                reservation = list(reservation)
-                email = get_emailData_by_customerid(reservation[5])
-                reservation.append(email)
-                reservationsTableData[i] = reservation
-            dropoffHTML = generate_pickupdropoff_html(reservationsTableData)
-            
-            if session["Usertype"] == 1:
-                return render_template("pickup-dropoff.html", admin=admin_nav(), pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickup_modal_html=pickup_modalhtml, dropoff_modal_html=dropoff_modalhtml)
-            return render_template("pickup-dropoff.html", pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickup_modal_html=pickup_modalhtml, dropoff_modal_html=dropoff_modalhtml)
-
+    if pickupEmail != "":
+        pickupTableData = get_customer_tableData(pickupEmail, numRows=page_size, before=pickupBefore)
+    else:
+        pickupTableData = get_reservations_tableData(page_size, before=pickupBefore)
+    
+    if pickupEmail == "" and dropoffEmail != "":
+        dropoffTableData = get_customer_tableData(dropoffEmail, True, numRows=page_size, before=dropoffBefore)
     else:
-        reservationsTableData = get_reservations_tableData()
-        for i, reservation in enumerate(reservationsTableData):
-            pickup_modalhtml += pickup_modal_html(reservation[0])
-            reservation = list(reservation)
-            email = get_emailData_by_customerid(reservation[5])
-            reservation.append(email)
-            reservationsTableData[i] = reservation
-        pickupHTML = generate_pickupdropoff_html(reservationsTableData)
-
-        reservationsTableData = get_reservations_tableData(pickedup=True)
-        for i, reservation in enumerate(reservationsTableData):
-            dropoff_modalhtml += dropoff_modal_html(reservation[0])
-            reservation = list(reservation)
-            email = get_emailData_by_customerid(reservation[5])
-            reservation.append(email)
-            reservationsTableData[i] = reservation
-        dropoffHTML = generate_pickupdropoff_html(reservationsTableData)
+        dropoffTableData = get_reservations_tableData(page_size, pickedup=True, before=dropoffBefore)
+    
+    # Modals are fetched on demand from /reservation/<id>/modal
+    pickupHTML = generate_pickupdropoff_html(pickupTableData)
+    dropoffHTML = generate_pickupdropoff_html(dropoffTableData)
+    
+    params = {'pickupemail': pickupEmail or None, 'dropoffemail': dropoffEmail or None, 'page_size': page_size}
+    pickupPager = generate_pager_html(
+        url_for('pickupdropoff', dropoff_before=dropoffBefore, **params) if pickupBefore else None,
+        url_for('pickupdropoff', pickup_before=next_cursor(pickupTableData, page_size), dropoff_before=dropoffBefore, **params) if next_cursor(pickupTableData, page_size) else None
+    )
+    dropoffPager = generate_pager_html(
+        url_for('pickupdropoff', pickup_before=pickupBefore, **params) if dropoffBefore else None,
+        url_for('pickupdropoff', pickup_before=pickupBefore, dropoff_before=next_cursor(dropoffTableData, page_size), **params) if next_cursor(dropoffTableData, page_size) else None
+    )
 
     if session["Usertype"] == 1:
-        return render_template("pickup-dropoff.html", admin=admin_nav(), pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickup_modal_html=pickup_modalhtml, dropoff_modal_html=dropoff_modalhtml)
-    return render_template("pickup-dropoff.html", pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickup_modal_html=pickup_modal_html, dropoff_modal_html=dropoff_modal_html)
+        return render_template("pickup-dropoff.html", admin=admin_nav(), pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickupPager=pickupPager, dropoffPager=dropoffPager)
+    return render_template("pickup-dropoff.html", pickupHTML=pickupHTML, dropoffHTML=dropoffHTML, pickupPager=pickupPager, dropoffPager=dropoffPager)
+
+@app.route('/api/reservations')
+def api_reservations():
+    """Return one keyset-paginated page of pickup or drop-off reservations as JSON."""
+    if "UserID" not in session:
+        return jsonify({'error': 'Login required'}), 401
+    
+    status = request.args.get('status', 'pickup')
+    if status not in ('pickup', 'dropoff'):
+        return jsonify({'error': "status must be 'pickup' or 'dropoff'"}), 400
+    
+    email = request.args.get('email', '')
+    before = request.args.get('cursor', type=int)
+    page_size = get_page_size()
+    pickedUp = status == 'dropoff'
+    
+    if email != "":
+        rows = get_customer_tableData(email, pickedUp, numRows=page_size, before=before)
+    else:
+        rows = get_reservations_tableData(page_size, pickedup=pickedUp, before=before)
+    
+    reservations = [
+        {
+            'reservationID': row[0],
+            'vehicleID': row[1],
+            'startDate': row[2],
+            'endDate': row[3],
+            'invoiceID': row[4],
+            'customerID': row[5],
+            'email': row[7],
+            'vehicle': f"{row[10]} {row[8]} {row[9]}",
+            'totalPrice': row[17],
+            'signedContract': row[18],
+            'paymentStatus': row[19],
+            'paidAmount': row[20]
+        }
+        for row in rows
+    ]
+    return jsonify({'reservations': reservations, 'next_cursor': next_cursor(rows, page_size)})
+
+@app.route('/reservation/<int:reservation_id>/modal')
+def reservation_modal(reservation_id):
+    """Render the pickup or drop-off modal for a single reservation."""
+    if "UserID" not in session:
+        return redirect(url_for("index"))
+    
+    reservation = get_reservation_details(reservation_id)
+    if not reservation:
+        return "Reservation not found", 404
+    
+    if reservation[21] == "True":
+        return dropoff_modal_html(reservation)
+    return pickup_modal_html(reservation)
 
 @app.route('/pickup/<int:reservation_id>', methods=['POST', 'GET'])
 def pickup_car_route(reservation_id):
@@ -846,7 +982,7 @@ def generate_report():
     if not startDate or not endDate:
         return jsonify({'error': 'Both startDate and endDate are required'}), 400
     
-    return vehicleReport(startDate, endDate)
+    return send_document('vehicle_report', [startDate, endDate])
 
 @app.route('/GenerateRentalAgreement/<int:reservation_id>')
 def GenerateRentalAgreement(reservation_id):
@@ -854,7 +990,7 @@ def GenerateRentalAgreement(reservation_id):
     if "UserID" not in session:
         return redirect(url_for("index"))
         
-    return rentalAgreement(reservation_id)
+    return send_document('rental_agreement', [reservation_id])
 
 @app.route('/GenerateInvoice')
 def GenerateInvoice():
@@ -863,7 +999,7 @@ def GenerateInvoice():
         return redirect(url_for("index"))
     
     reservation_id = 1
-    return invoiceFromReservation(reservation_id)
+    return send_document('invoice', [reservation_id])
 
 @app.route('/generateRentalBill/<int:reservationid>', methods=['POST', 'GET'])
 def generateRentalBill(reservationid):
@@ -871,7 +1007,7 @@ def generateRentalBill(reservationid):
     if "UserID" not in session:
         return redirect(url_for("index"))
     
-    return invoiceForSingleVehicle(reservationid) 
+    return send_document('vehicle_invoice', [reservationid])
 
 @app.route('/generateConsolidatedRentalBill/<int:reservationid>', methods=['POST', 'GET'])
 def generateConsolidatedRentalBill(reservationid):
@@ -879,7 +1015,194 @@ def generateConsolidatedRentalBill(reservationid):
     if "UserID" not in session:
         return redirect(url_for("index"))
     
-    return invoiceFromReservation(reservationid)  
+    return send_document('invoice', [reservationid])
+
+def send_document(kind, args):
+    """
+    Serves a cached document straight from the PDF cache, with its cache key
+    (a hash of everything it is drawn from) as ETag. The vehicle report and
+    cache misses are queued for background rendering instead.
+    """
+    if kind in CACHED_REPORTS:
+        try:
+            source = CACHED_REPORTS[kind](*args)
+        except ReportNotFound as e:
+            return jsonify({'error': str(e)}), 404
+        cached = not_modified(source.key)
+        if cached is not None:
+            return cached
+        data = pdf_cache.get(source.key)
+        if data is not None:
+            return with_etag(pdf_download(data, source.filename, disposition='inline'), source.key)
+    return queue_document(kind, args)
+
+def queue_document(kind, args):
+    """Queues a document for background rendering and sends the browser to a page that waits for it."""
+    try:
+        job = job_queue.submit(kind, args, session['UserID'])
+    except Exception as e:
+        print(f"Error queueing {kind} job: {e}")
+        return jsonify({'error': 'Failed to queue the document'}), 500
+    return redirect(url_for('report_job_page', job_id=job['job_id']), code=303)
+
+def job_response(job):
+    """Public view of a job record, with the URLs to poll and download it."""
+    return {
+        'job_id': job['job_id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'error': job['error'],
+        'status_url': url_for('report_job_status', job_id=job['job_id']),
+        'download_url': url_for('download_report_job', job_id=job['job_id']) if job['status'] == 'done' else None
+    }
+
+def get_own_job(job_id):
+    """Returns the job if it exists and belongs to the logged-in user (admins see every job)."""
+    job = job_queue.status(job_id)
+    if job and (job['user_id'] == session['UserID'] or session['Usertype'] == 1):
+        return job
+    return None
+
+@app.route('/reports/jobs', methods=['POST'])
+def submit_report_job():
+    """Queue a report, rental agreement or invoice for background rendering."""
+    if "UserID" not in session:
+        return jsonify({'error': 'Login required'}), 401
+
+    kind = request.form.get('kind', '')
+    if kind not in REPORT_KINDS:
+        return jsonify({'error': f"kind must be one of: {', '.join(REPORT_KINDS)}"}), 400
+    if kind in ADMIN_REPORTS and session["Usertype"] != 1:
+        return jsonify({'error': 'Admin access required'}), 403
+
+    args = []
+    for field, field_type in REPORT_KINDS[kind][1]:
+        try:
+            if not request.form.get(field):
+                raise ValueError(field)
+            args.append(field_type(request.form[field]))
+        except ValueError:
+            return jsonify({'error': f"{field} is required and must be a valid {field_type.__name__}"}), 400
+
+    try:
+        job = job_queue.submit(kind, args, session['UserID'])
+    except Exception as e:
+        print(f"Error queueing {kind} job: {e}")
+        return jsonify({'error': 'Failed to queue the document'}), 500
+    return jsonify(job_response(job)), 202
+
+@app.route('/reports/jobs/<job_id>')
+def report_job_status(job_id):
+    """Return the status of a queued report job."""
+    if "UserID" not in session:
+        return jsonify({'error': 'Login required'}), 401
+
+    job = get_own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/reports/jobs/<job_id>/wait')
+def report_job_page(job_id):
+    """Page that polls a queued document and downloads it once it is ready."""
+    if "UserID" not in session:
+        return redirect(url_for("index"))
+
+    job = get_own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return render_template('report-job.html', job=job_response(job))
+
+@app.route('/reports/jobs/<job_id>/download')
+def download_report_job(job_id):
+    """Send the PDF produced by a finished report job."""
+    if "UserID" not in session:
+        return redirect(url_for("index"))
+
+    job = get_own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify(job_response(job)), 409
+    if job.get('key'):
+        cached = not_modified(job['key'])
+        if cached is not None:
+            return cached
+        data = pdf_cache.get(job['key'])
+        if data is None:
+            # Evicted from the PDF cache since the job finished; render it again
+            return queue_document(job['kind'], job['args'])
+        return with_etag(pdf_download(data, job['filename']), job['key'])
+    return send_file(os.path.abspath(job_queue.result_path(job_id)), mimetype='application/pdf', as_attachment=True, download_name=job['filename'])
+
+@app.route('/invoices/export')
+def bulk_invoice_export():
+    """Stream the invoice of every reservation starting in a date range, as a ZIP or one merged PDF."""
+    if "UserID" not in session:
+        return redirect(url_for("index"))
+    if session["Usertype"] != 1:
+        return redirect(url_for("products"))
+
+    startDate = request.args.get('startDate', '')
+    endDate = request.args.get('endDate', '')
+    export_format = request.args.get('format', 'zip')
+
+    if not startDate or not endDate:
+        return jsonify({'error': 'Both startDate and endDate are required'}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    try:
+        rows = get_invoice_rows(startDate, endDate)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD or MM/DD/YYYY'}), 400
+    if not rows:
+        return jsonify({'error': 'No invoices found for that date range'}), 404
+
+    try:
+        chunks = export_invoices(rows, export_format)
+    except Exception as e:
+        print(f"Error exporting invoices: {e}")
+        return jsonify({'error': 'Failed to export invoices'}), 500
+
+    return app.response_class(
+        chunks,
+        mimetype='application/zip' if export_format == 'zip' else 'application/pdf',
+        headers={'Content-Disposition': f'attachment; filename={export_filename(startDate, endDate, export_format)}'}
+    )
+
+@app.route('/api/reports/rollup')
+def rollup_report():
+    """Reservations, revenue, rented days and payments per vehicle, type or location, from the daily rollups."""
+    if "UserID" not in session:
+        return redirect(url_for("index"))
+    if session["Usertype"] != 1:
+        return redirect(url_for("products"))
+
+    startDate = request.args.get('startDate', '')
+    endDate = request.args.get('endDate', '')
+    group_by = request.args.get('groupBy', 'vehicle')
+
+    if not startDate or not endDate:
+        return jsonify({'error': 'Both startDate and endDate are required'}), 400
+    if group_by not in ROLLUP_GROUPS:
+        return jsonify({'error': f"groupBy must be one of: {', '.join(ROLLUP_GROUPS)}"}), 400
+
+    try:
+        rows = get_rollup(startDate, endDate, group_by)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD or MM/DD/YYYY'}), 400
+
+    return jsonify([
+        {
+            group_by: row[0],
+            'reservations': row[1],
+            'revenue': round(row[2], 2),
+            'rented_days': row[3],
+            'paid': round(row[4], 2)
+        }
+        for row in rows
+    ])
 
 # =====================
 # 10. Main Entry Point
@@ -0,0 +1,219 @@
+# ---------------------- Imports and Constants ----------------------
+import threading
+from bisect import bisect_right, insort
+from datetime import date
+from database import get_connection, close_thread_connection
+
+# Searches spanning more days than this are left to the indexed SQL query
+MAX_BUCKET_SPAN = 62
+
+def today_day_number():
+    """
+    Julian day number of today, matching Reservations.StartDay / EndDay.
+    """
+    return date.today().toordinal() + 1721424
+
+# ---------------------- Availability Index ----------------------
+
+class AvailabilityIndex:
+    """
+    In-process index of reservation intervals, stored as julian day numbers
+    (Reservations.StartDay / EndDay).
+
+    Each vehicle keeps a list of (start, end, reservation_id) sorted by start,
+    used for single-vehicle checks. Days from the load date onwards also keep
+    a {vehicle_id: count} bucket, so searches for upcoming dates are a handful
+    of set unions. Searches that start before the load date or span more
+    than MAX_BUCKET_SPAN days have no cheap answer here (it would mean
+    scanning every reservation ending after the start), so busy_vehicles()
+    returns None for them and callers use the indexed SQL query instead.
+
+    While the index is not loaded (startup failure or after invalidate()),
+    callers get None back and should fall back to SQL.
+
+    The index remembers the ReservationsVersion it was built at. Writes made
+    by other processes (other web workers, scripts) bump that counter
+    without passing through here, so callers check is_current() first; a
+    stale index is dropped and rebuilt in the background.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_vehicle = {}
+        self._days = {}
+        self._first_day = 0
+        self._reloading = False
+        self.loaded = False
+        self.version = None
+
+    def load(self, conn=None):
+        """
+        Rebuilds the whole index from the Reservations table.
+        """
+        conn = conn or get_connection()
+        # Read the version first: a write landing between the two reads then
+        # only makes the index look stale, never current while missing rows
+        version = conn.execute("SELECT ReservationsVersion FROM CatalogVersion WHERE ID = 1").fetchone()
+        rows = conn.execute(
+            "SELECT VehicleID, StartDay, EndDay, ReservationID FROM Reservations WHERE StartDay IS NOT NULL"
+        ).fetchall()
+        self.build(rows, version=version[0] if version else None)
+
+    def build(self, rows, first_day=None, version=None):
+        """
+        Rebuilds the index from (vehicle_id, start, end, reservation_id) rows
+        as of ReservationsVersion `version`. Per-day buckets are kept from
+        first_day (default: today) onwards.
+        """
+        first_day = today_day_number() if first_day is None else first_day
+        by_vehicle = {}
+        days = {}
+        for vehicle_id, start, end, reservation_id in rows:
+            by_vehicle.setdefault(vehicle_id, []).append((start, end, reservation_id))
+            self._count_days(days, first_day, vehicle_id, start, end, 1)
+        for intervals in by_vehicle.values():
+            intervals.sort()
+        with self._lock:
+            self._by_vehicle = by_vehicle
+            self._days = days
+            self._first_day = first_day
+            self.loaded = True
+            self.version = version
+
+    @staticmethod
+    def _count_days(days, first_day, vehicle_id, start, end, delta):
+        for day in range(max(start, first_day), end + 1):
+            bucket = days.setdefault(day, {})
+            count = bucket.get(vehicle_id, 0) + delta
+            if count > 0:
+                bucket[vehicle_id] = count
+            else:
+                bucket.pop(vehicle_id, None)
+
+    def invalidate(self):
+        """
+        Marks the index as stale so searches fall back to SQL until the next load().
+        """
+        with self._lock:
+            self.loaded = False
+            self.version = None
+            self._by_vehicle = {}
+            self._days = {}
+
+    def is_current(self, version):
+        """
+        Returns True if the index is loaded at ReservationsVersion `version`.
+        Otherwise the index is invalidated, a background reload is started
+        and False is returned, so the caller answers from SQL meanwhile.
+        """
+        with self._lock:
+            if self.loaded and self.version == version:
+                return True
+        if self.loaded:
+            self.invalidate()
+        self._reload_in_background()
+        return False
+
+    def _reload_in_background(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, name="availability-reload", daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Error reloading availability index: {e}")
+        finally:
+            close_thread_connection()
+            with self._lock:
+                self._reloading = False
+
+    def add_written(self, reservations, version_before, version_after):
+        """
+        Records the (vehicle_id, start, end, reservation_id) reservations
+        inserted by one transaction, which moved ReservationsVersion from
+        version_before to version_after. If the index was not at
+        version_before, it missed another writer and is invalidated instead.
+        """
+        with self._lock:
+            current = self.loaded and self.version == version_before
+        if not current:
+            self.invalidate()
+            return
+        for reservation in reservations:
+            self.add(*reservation)
+        with self._lock:
+            if self.loaded:
+                self.version = version_after
+
+    def add(self, vehicle_id, start, end, reservation_id):
+        """
+        Records a newly inserted reservation.
+        """
+        with self._lock:
+            if not self.loaded:
+                return
+            insort(self._by_vehicle.setdefault(vehicle_id, []), (start, end, reservation_id))
+            self._count_days(self._days, self._first_day, vehicle_id, start, end, 1)
+
+    def reload_vehicle(self, vehicle_id, conn=None):
+        """
+        Re-reads one vehicle's reservations after they were changed in the database.
+        """
+        if not self.loaded:
+            return
+        conn = conn or get_connection()
+        rows = conn.execute(
+            "SELECT StartDay, EndDay, ReservationID FROM Reservations WHERE VehicleID = ? AND StartDay IS NOT NULL",
+            (vehicle_id,)
+        ).fetchall()
+        with self._lock:
+            for start, end, reservation_id in self._by_vehicle.pop(vehicle_id, []):
+                self._count_days(self._days, self._first_day, vehicle_id, start, end, -1)
+            intervals = sorted(rows)
+            if intervals:
+                self._by_vehicle[vehicle_id] = intervals
+            for start, end, reservation_id in intervals:
+                self._count_days(self._days, self._first_day, vehicle_id, start, end, 1)
+
+    def is_free(self, vehicle_id, start, end):
+        """
+        Returns True if the vehicle has no reservation overlapping [start, end],
+        or None if the index is not loaded.
+        """
+        with self._lock:
+            if not self.loaded:
+                return None
+            intervals = self._by_vehicle.get(vehicle_id, [])
+            # Only intervals starting on or before `end` can overlap
+            for i in range(bisect_right(intervals, (end, float("inf"))) - 1, -1, -1):
+                if intervals[i][1] >= start:
+                    return False
+            return True
+
+    def busy_vehicles(self, start, end):
+        """
+        Returns the set of vehicle IDs with a reservation overlapping [start, end],
+        or None if the index is not loaded or the range is outside the per-day
+        buckets (starts before the load date or spans more than MAX_BUCKET_SPAN days).
+        """
+        with self._lock:
+            if not self.loaded or start < self._first_day or end - start > MAX_BUCKET_SPAN:
+                return None
+            empty = {}
+            return set().union(*(self._days.get(day, empty) for day in range(start, end + 1)))
+
+    def filter_free(self, vehicles, start, end):
+        """
+        Filters Vehicles rows (VehicleID first) down to those free for
+        [start, end], or returns None if busy_vehicles() cannot answer.
+        """
+        busy = self.busy_vehicles(start, end)
+        if busy is None:
+            return None
+        return [vehicle for vehicle in vehicles if vehicle[0] not in busy]
+
+availability_index = AvailabilityIndex()
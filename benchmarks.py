@@ -0,0 +1,254 @@
+# ---------------------- Imports and Constants ----------------------
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+import database
+from availability import AvailabilityIndex
+
+# ---------------------- Helpers ----------------------
+
+def timed(function, *args, repeat=100):
+    """
+    Returns the average wall time of function(*args) in milliseconds.
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+def scratch_database():
+    """
+    Points database.db_path at a migrated throwaway copy of the database.
+    Returns a function that removes the copy and restores the original path.
+    """
+    original = database.db_path
+    scratch = tempfile.mkdtemp()
+    shutil.copy(original, scratch)
+    database.db_path = os.path.join(scratch, os.path.basename(original))
+    database.init_db()
+
+    def restore():
+        database.close_thread_connection()
+        database.close_pool()
+        database.db_path = original
+        shutil.rmtree(scratch)
+    return restore
+
+# ---------------------- Benchmarks ----------------------
+
+def benchmark_availability(num_vehicles=10000, num_reservations=1000000, horizon_days=3650):
+    """
+    Times date-range searches against a synthetic AvailabilityIndex holding
+    num_reservations bookings spread over the past horizon_days, with searches
+    issued for the upcoming weeks as on the products page.
+    """
+    today = 2460000
+    rows = []
+    for reservation_id in range(num_reservations):
+        start = today - horizon_days + random.randrange(horizon_days + 60)
+        rows.append((random.randrange(num_vehicles), start, start + random.randrange(1, 14), reservation_id))
+
+    index = AvailabilityIndex()
+    started = time.perf_counter()
+    index.build(rows, first_day=today)
+    print(f"Built index of {num_reservations} reservations in {time.perf_counter() - started:.2f}s")
+
+    vehicles = [(vehicle_id,) for vehicle_id in range(num_vehicles)]
+    start = today + 7
+    print(f"busy_vehicles:  {timed(index.busy_vehicles, start, start + 7):.3f} ms")
+    print(f"is_free:        {timed(index.is_free, 42, start, start + 7):.4f} ms")
+    print(f"filter_free:    {timed(index.filter_free, vehicles, start, start + 7):.3f} ms")
+
+def benchmark_checkout_contention(workers=8, rounds=25):
+    """
+    Runs `workers` threads that each check out `rounds` single-car carts
+    against a scratch copy of car_rental.db. In the "same vehicle" run every
+    worker competes for the same car and dates, so all but one checkout per
+    round must fail with ReservationConflict; in the "different vehicles"
+    run each worker books its own car.
+    """
+    from sqlQueries import checkout_db, ReservationConflict
+
+    restore = scratch_database()
+    vehicles = [row[0] for row in database.get_connection().execute("SELECT VehicleID FROM Vehicles ORDER BY VehicleID LIMIT ?", (workers,))]
+    database.close_thread_connection()
+
+    def run(label, vehicle_for_worker, first_day):
+        results = {"booked": 0, "conflicts": 0}
+        results_lock = threading.Lock()
+
+        def worker(n):
+            for round_number in range(rounds):
+                start = first_day + timedelta(days=round_number * 3)
+                item = (vehicle_for_worker(n), 1, start.strftime("%m/%d/%Y"), (start + timedelta(days=1)).strftime("%m/%d/%Y"), 2, 10, 100.0)
+                try:
+                    checkout_db("Bench", "1 Bench St", "9105550000", f"bench{n}@bench.com", "bench.jpg", [item], 10, 1)
+                    outcome = "booked"
+                except ReservationConflict:
+                    outcome = "conflicts"
+                with results_lock:
+                    results[outcome] += 1
+            database.close_thread_connection()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        attempts = workers * rounds
+        print(f"{label}: {attempts / elapsed:.0f} checkouts/s, {results['booked']} booked, {results['conflicts']} conflicts")
+
+    run("same vehicle", lambda n: vehicles[0], date(2090, 1, 1))
+    run("different vehicles", lambda n: vehicles[n % len(vehicles)], date(2095, 1, 1))
+    print(f"lock stats: {database.get_lock_stats()}")
+    restore()
+
+def benchmark_sessions(requests=2000):
+    """
+    Compares per-request overhead and cookie size of Flask's signed cookie
+    session against the server-side session store, for a session holding
+    what login_user() stores.
+    """
+    from flask import Flask, session
+    from sessions import ServerSessionInterface, session_store
+
+    restore = scratch_database()
+    user = {
+        "UserID": 1, "Name": "Benchmark User", "Address": "123 Maple St, Fayetteville, NC 28301",
+        "Phone": "910-555-0123", "Email": "benchmark@example.com", "Age": 30, "Gender": "Other",
+        "InsuranceCompany": "Benchmark Mutual", "UserPhoto": "static/uploads/userPhotos/benchmark.jpg",
+        "Username": "benchmark", "DLPhotos": "static/uploads/driversLicense/benchmark.jpg", "Usertype": 0,
+        "CartID": "0" * 32,
+    }
+
+    for label, interface in (("cookie session", None), ("server session", ServerSessionInterface(session_store))):
+        app = Flask(__name__)
+        app.secret_key = "benchmark"
+        app.teardown_appcontext(database.close_connection)
+        if interface is not None:
+            app.session_interface = interface
+
+        @app.route("/login")
+        def login():
+            session.update(user)
+            return ""
+
+        @app.route("/page")
+        def page():
+            return str(session["UserID"])
+
+        client = app.test_client()
+        client.get("/login")
+        cookie = client.get_cookie("session").value
+        per_request = timed(client.get, "/page", repeat=requests)
+        print(f"{label}: {per_request * 1000:.0f} us/request, cookie {len(cookie)} bytes")
+    print(f"session cache: {session_store.stats()}")
+    restore()
+
+def benchmark_report_jobs(reports=16):
+    """
+    Renders the same vehicle report `reports` times in the calling thread,
+    then through the background job queue with threads and with processes.
+    """
+    from generate import vehicleReportPDF
+    from jobs import JobQueue
+
+    restore = scratch_database()
+    args = ("2024-01-01", "2024-12-31")
+    started = time.perf_counter()
+    for _ in range(reports):
+        vehicleReportPDF(*args)
+    elapsed = time.perf_counter() - started
+    print(f"request thread: {reports / elapsed:.1f} reports/s")
+
+    for label, processes in (("thread pool", False), ("process pool", True)):
+        directory = tempfile.mkdtemp()
+        queue = JobQueue(directory=directory, processes=processes)
+        # Start every worker before timing so process start-up is not counted
+        for _ in range(queue.workers):
+            queue.submit("vehicle_report", args)
+        while queue.stats()["pending"]:
+            time.sleep(0.01)
+        started = time.perf_counter()
+        for _ in range(reports):
+            queue.submit("vehicle_report", args)
+        while queue.stats()["pending"]:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - started
+        print(f"{label} ({queue.workers} workers): {reports / elapsed:.1f} reports/s, {queue.stats()}")
+        queue.shutdown()
+        shutil.rmtree(directory)
+    restore()
+
+def benchmark_rollups(reservations=100000, ranges=200):
+    """
+    Adds `reservations` reservations to a scratch copy of car_rental.db and
+    compares the vehicle report's revenue query over Reservations with the
+    same figure read from the daily rollups, checking both agree.
+    """
+    from migrations import rebuild_rollups
+    from sqlQueries import get_range_revenue, get_rollup, to_day_number
+
+    restore = scratch_database()
+    conn = database.get_connection()
+    vehicles = [row[0] for row in conn.execute("SELECT VehicleID FROM Vehicles")]
+    rng = random.Random(25)
+    first = date(2030, 1, 1)
+    rows = []
+    for _ in range(reservations):
+        start = first + timedelta(days=rng.randrange(3 * 365))
+        days = rng.randint(1, 14)
+        end = start + timedelta(days=days - 1)
+        rows.append((rng.choice(vehicles), start.strftime("%m/%d/%Y"), end.strftime("%m/%d/%Y"), days, days * rng.randint(30, 120)))
+    started = time.perf_counter()
+    conn.executemany(
+        "INSERT INTO Reservations (VehicleID, UserID, PlanID, ReserveStartDate, ReserveEndDate, NumDays, PickUpLocation, DropOffLocation, TotalPrice) "
+        "VALUES (?, 1, 1, ?, ?, ?, 1, 1, ?)",
+        rows
+    )
+    conn.commit()
+    print(f"insert (triggers maintain rollups): {(time.perf_counter() - started) * 1e6 / reservations:.1f} us/reservation")
+
+    start_day = to_day_number(first.isoformat())
+    samples = []
+    for _ in range(ranges):
+        low = start_day + rng.randrange(3 * 365)
+        samples.append((low, low + rng.randint(0, 90)))
+
+    def scan(low, high):
+        return conn.execute("SELECT SUM(TotalPrice) FROM Reservations WHERE StartDay <= ? AND EndDay >= ?", (high, low)).fetchone()[0] or 0.0
+
+    mismatches = sum(abs(scan(low, high) - get_range_revenue(low, high)) > 0.005 for low, high in samples)
+    print(f"reservation scan: {sum(timed(scan, low, high, repeat=1) for low, high in samples) / ranges:.3f} ms/report")
+    print(f"daily rollups:    {sum(timed(get_range_revenue, low, high, repeat=1) for low, high in samples) / ranges:.3f} ms/report, {mismatches} mismatches")
+    print(f"rollup by type (1 year): {timed(get_rollup, '2031-01-01', '2031-12-31', 'type', repeat=20):.3f} ms")
+
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    rebuilt = rebuild_rollups(conn)
+    conn.commit()
+    print(f"rebuild: {(time.perf_counter() - started) * 1000:.0f} ms for {rebuilt} rows")
+    restore()
+
+BENCHMARKS = {
+    "availability": benchmark_availability,
+    "checkout": benchmark_checkout_contention,
+    "sessions": benchmark_sessions,
+    "reports": benchmark_report_jobs,
+    "rollups": benchmark_rollups,
+}
+
+# ---------------------- Command Line ----------------------
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
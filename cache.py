@@ -0,0 +1,277 @@
+# ---------------------- Imports and Constants ----------------------
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a cached reference table is trusted before it is re-read. Explicit
+# invalidate() calls only reach the current process, so with several workers
+# this bounds how long another worker can serve a stale copy.
+REFERENCE_CACHE_TTL = 300
+
+# Number of Vehicles rows kept by vehicle_cache. Entries are tagged with
+# CatalogVersion, which every vehicle write bumps, so rows changed by
+# another process are never served.
+VEHICLE_CACHE_SIZE = 512
+
+# Number of product grid fragments (one per vehicle row version) and of
+# whole rendered pages kept
+FRAGMENT_CACHE_SIZE = 2048
+PAGE_CACHE_SIZE = 8
+
+# Number of vehicles whose merged reserved-date ranges are kept
+CALENDAR_CACHE_SIZE = 512
+
+# Directory and total size budget of the on-disk cache of rendered invoices
+# and rental agreements
+PDF_CACHE_DIR = 'pdf_cache'
+PDF_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# ---------------------- Reference Table Cache ----------------------
+
+class ReferenceCache:
+    """
+    Read-through cache for small, rarely edited tables (Locations,
+    RentalPlans, ServiceIntervals). Each table is registered with a loader
+    that reads the whole table; get() returns the cached result until the
+    TTL runs out or invalidate() is called.
+
+    Hits and misses are counted per table so the metrics page can show
+    whether request paths still reach the database for these lookups.
+
+    The generation is bumped whenever cached contents may have changed (an
+    invalidate(), or a reload that read different rows), so pages rendered
+    from these tables can include it in their ETags.
+    """
+
+    def __init__(self, ttl=REFERENCE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaders = {}
+        self._entries = {}
+        self._stats = {}
+        self._generation = 0
+
+    def register(self, name, loader):
+        """
+        Registers the loader used to (re)read the table called `name`.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._stats[name] = {"hits": 0, "misses": 0}
+
+    def get(self, name):
+        """
+        Returns the cached contents of `name`, loading them on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] > now:
+                self._stats[name]["hits"] += 1
+                return entry[1]
+            self._stats[name]["misses"] += 1
+            loader = self._loaders[name]
+        value = loader()
+        with self._lock:
+            previous = self._entries.get(name)
+            if previous is not None and previous[1] != value:
+                self._generation += 1
+            self._entries[name] = (now + self.ttl, value)
+        return value
+
+    def generation(self, *names):
+        """
+        Returns the current generation after making sure the named tables
+        are loaded and within their TTL.
+        """
+        for name in names:
+            self.get(name)
+        with self._lock:
+            return self._generation
+
+    def invalidate(self, name=None):
+        """
+        Drops one cached table, or all of them when no name is given.
+        """
+        with self._lock:
+            self._generation += 1
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        """
+        Returns a snapshot of the per-table hit/miss counters.
+        """
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+reference_cache = ReferenceCache()
+
+# ---------------------- LRU Record Cache ----------------------
+
+class LRUCache:
+    """
+    Bounded key -> row cache that evicts the least recently used entry once
+    `maxsize` entries are stored. Writers call invalidate(key) after
+    changing a row so the next read goes back to the database.
+
+    Callers may also pass the current value of a database version counter
+    to get() and put(). When it moves, every entry is dropped, which covers
+    writes made by other processes; a put() under an outdated version is
+    ignored, so a slow reader cannot cache a row older than the flush.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "flushes": 0}
+
+    def get(self, key, version=None):
+        """
+        Returns the cached value for `key`, or None on a miss.
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                self._entries.clear()
+                self._version = version
+                self._stats["flushes"] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key=None):
+        """
+        Drops one entry, or every entry when no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxsize=self.maxsize)
+
+vehicle_cache = LRUCache(VEHICLE_CACHE_SIZE)
+fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE)
+page_cache = LRUCache(PAGE_CACHE_SIZE)
+calendar_cache = LRUCache(CALENDAR_CACHE_SIZE)
+
+# ---------------------- PDF Disk Cache ----------------------
+
+class PDFCache:
+    """
+    Content-addressed store of rendered PDFs, one file per key. A key is a
+    hash of every row the document is drawn from, so a changed reservation,
+    payment or rate simply produces a new key and stale files are never
+    served; they age out instead.
+
+    Reads touch the file's mtime, which makes eviction least recently used
+    across every worker sharing the directory. The sizes are tracked in
+    memory and the directory is re-scanned only when the budget is exceeded.
+    """
+
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = None
+        self._total = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(*inputs):
+        """
+        Returns the cache key for a document built from `inputs`.
+        """
+        return hashlib.sha256(repr(inputs).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _scan(self):
+        # Oldest first, so eviction pops from the front
+        entries = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+        self._sizes = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._sizes.values())
+
+    def get(self, key):
+        """
+        Returns the cached PDF bytes for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+            if self._sizes is not None and key in self._sizes:
+                self._sizes.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            if self._sizes is None:
+                self._scan()
+            else:
+                self._total += len(data) - self._sizes.pop(key, 0)
+                self._sizes[key] = len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other workers add and remove files too, so start from the directory itself
+        self._scan()
+        while self._total > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+                self._stats["evictions"] += 1
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            if self._sizes is None:
+                self._scan()
+            return dict(self._stats, files=len(self._sizes), bytes=self._total, max_bytes=self.max_bytes)
+
+pdf_cache = PDFCache()
@@ -0,0 +1,99 @@
+# ---------------------- Imports and Constants ----------------------
+import secrets
+import time
+from typing import NamedTuple
+from flask import session
+from database import get_connection
+from sqlQueries import get_vehicle_by_id, get_rates_by_vehicle_type, to_day_number
+
+# Carts untouched for this many seconds are deleted by purge_stale_carts()
+CART_MAX_AGE = 30 * 24 * 60 * 60
+
+# ---------------------- Cart Item Model ----------------------
+
+class CartItem(NamedTuple):
+    """
+    One line of a cart, in CartItems column order. line_total is the rental
+    rate times num_days, fixed when the item is added.
+    """
+    item_id: int
+    vehicle_id: int
+    start_date: str
+    end_date: str
+    num_days: int
+    line_total: float
+
+    @property
+    def daterange(self):
+        return f"{self.start_date} - {self.end_date}"
+
+    @property
+    def day_range(self):
+        """(StartDay, EndDay) as julian day numbers."""
+        return (to_day_number(self.start_date), to_day_number(self.end_date))
+
+# ---------------------- Cart Store ----------------------
+
+def get_cart_id():
+    """
+    Returns the current session's cart ID, creating one if needed. Only this
+    ID is stored in the session cookie; the items live in CartItems.
+    """
+    if not session.get("CartID"):
+        session["CartID"] = secrets.token_hex(16)
+    return session["CartID"]
+
+def get_cart_items(cart_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''
+        SELECT CartItemID, VehicleID, StartDate, EndDate, NumDays, LineTotal
+        FROM CartItems WHERE CartID = ? ORDER BY CartItemID
+        ''',
+        (cart_id,)
+    )
+    return [CartItem(*row) for row in cursor.fetchall()]
+
+def add_cart_item(cart_id, vehicle_id, start_date, end_date, num_days):
+    """
+    Adds a vehicle and date range to the cart and returns the new CartItem.
+    """
+    vehicle = get_vehicle_by_id(vehicle_id)
+    if not vehicle:
+        raise ValueError(f"Vehicle {vehicle_id} does not exist.")
+    line_total = get_rates_by_vehicle_type(vehicle[4])[0][3] * num_days
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''
+        INSERT INTO CartItems (CartID, VehicleID, StartDate, EndDate, NumDays, LineTotal, UpdatedOn)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''',
+        (cart_id, vehicle[0], start_date, end_date, num_days, line_total, time.time())
+    )
+    conn.commit()
+    return CartItem(cursor.lastrowid, vehicle[0], start_date, end_date, num_days, line_total)
+
+def remove_cart_item(cart_id, item_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM CartItems WHERE CartItemID = ? AND CartID = ?", (item_id, cart_id))
+    conn.commit()
+
+def clear_cart(cart_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM CartItems WHERE CartID = ?", (cart_id,))
+    conn.commit()
+
+def purge_stale_carts(max_age=CART_MAX_AGE):
+    """
+    Deletes cart items left behind by sessions that ended without checkout
+    or logout. Returns the number of rows removed.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM CartItems WHERE UpdatedOn < ?", (time.time() - max_age,))
+    conn.commit()
+    return cursor.rowcount
@@ -0,0 +1,198 @@
+# ---------------------- Imports and Constants ----------------------
+import queue
+import sqlite3
+import threading
+import time
+from flask import g, has_app_context
+from migrations import migrate
+
+# Database configuration
+db_path = 'car_rental.db'
+
+# Number of idle connections kept around for reuse between requests
+POOL_SIZE = 8
+
+# Applied once to every new connection
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+# Busy handling: connections do not wait inside SQLite (timeout=0). A locked
+# statement is retried here with exponential backoff, from BUSY_BACKOFF up to
+# BUSY_BACKOFF_MAX seconds between attempts, until BUSY_TIMEOUT seconds have
+# passed, so every wait shows up in the lock stats. Only statements outside a
+# transaction (including BEGIN) and COMMIT are retried; a statement inside a
+# transaction fails, and the transaction with it.
+BUSY_TIMEOUT = 5.0
+BUSY_BACKOFF = 0.001
+BUSY_BACKOFF_MAX = 0.05
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()
+
+_lock_stats = {"waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "failures": 0}
+_lock_stats_lock = threading.Lock()
+
+# ---------------------- Busy Handling ----------------------
+
+def _is_locked_error(error):
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+def _record_lock_wait(seconds, failed=False):
+    with _lock_stats_lock:
+        _lock_stats["waits"] += 1
+        _lock_stats["wait_seconds"] += seconds
+        _lock_stats["max_wait_seconds"] = max(_lock_stats["max_wait_seconds"], seconds)
+        if failed:
+            _lock_stats["failures"] += 1
+
+def _with_busy_retry(operation, *args, retry=True):
+    """
+    Runs a cursor/connection operation, retrying with backoff while another
+    writer holds the lock. The time from the first locked attempt to the one
+    that succeeds (or gives up) is recorded in the lock stats.
+    """
+    started = None
+    delay = BUSY_BACKOFF
+    while True:
+        try:
+            result = operation(*args)
+        except sqlite3.OperationalError as e:
+            if not _is_locked_error(e):
+                raise
+            now = time.perf_counter()
+            if started is None:
+                started = now
+            if not retry or now - started + delay > BUSY_TIMEOUT:
+                _record_lock_wait(now - started, failed=True)
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, BUSY_BACKOFF_MAX)
+            continue
+        if started is not None:
+            _record_lock_wait(time.perf_counter() - started)
+        return result
+
+class RetryingCursor(sqlite3.Cursor):
+    def _retry(self):
+        # Replaying one statement of an open transaction on its own is not
+        # safe; the caller has to roll back and start over
+        return not self.connection.in_transaction
+
+    def execute(self, *args):
+        return _with_busy_retry(super().execute, *args, retry=self._retry())
+
+    def executemany(self, *args):
+        return _with_busy_retry(super().executemany, *args, retry=self._retry())
+
+class RetryingConnection(sqlite3.Connection):
+    def cursor(self, factory=RetryingCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        return _with_busy_retry(super().commit)
+
+# ---------------------- Connection Pool ----------------------
+
+def _connect():
+    """
+    Opens a new connection with the configured pragmas applied.
+    """
+    # timeout=0: all waiting for locks happens in _with_busy_retry, where it is measured
+    conn = sqlite3.connect(db_path, timeout=0, check_same_thread=False, factory=RetryingConnection)
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+def _acquire():
+    """
+    Takes an idle connection from the pool, opening a new one if none are free.
+    """
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _connect()
+
+def _release(conn):
+    """
+    Returns a connection to the pool, discarding any uncommitted work.
+    """
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+# ---------------------- Public API ----------------------
+
+def init_db():
+    """
+    Bootstraps the database file: switches to WAL mode (persistent, so
+    readers no longer block on writers) and applies pending migrations.
+    """
+    conn = _connect()
+    conn.execute("PRAGMA journal_mode = WAL")
+    migrate(conn)
+    conn.close()
+
+def get_lock_stats():
+    """
+    Returns a snapshot of how often and how long statements waited on locks.
+    """
+    with _lock_stats_lock:
+        return dict(_lock_stats)
+
+def get_connection():
+    """
+    Returns the connection for the current request, or for the current thread
+    when called outside of a Flask app context (scripts, background jobs).
+    The connection is reused until close_connection() runs at teardown.
+    """
+    if has_app_context():
+        if "db_conn" not in g:
+            g.db_conn = _acquire()
+        return g.db_conn
+
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _acquire()
+    return conn
+
+def close_connection(exception=None):
+    """
+    Hands the request's connection back to the pool. Registered as an
+    app teardown handler in Flask_app.py.
+    """
+    conn = g.pop("db_conn", None) if has_app_context() else None
+    if conn is not None:
+        _release(conn)
+
+def close_thread_connection():
+    """
+    Releases the connection held by the current non-request thread.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        _release(conn)
+
+def close_pool():
+    """
+    Closes every idle pooled connection, e.g. after db_path was changed.
+    """
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            return
@@ -0,0 +1,133 @@
+# ---------------------- Imports and Constants ----------------------
+import argparse
+import zipfile
+from io import RawIOBase
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from database import get_connection
+from generate import SINGLE_INVOICE_QUERY, renderSingleVehicleInvoice, singleVehicleInvoice, drawInvoice
+from jobs import job_queue
+from sqlQueries import to_day_number
+
+# Invoices rendered per pool task, so the hand-off to a worker process is
+# paid once per batch rather than once per invoice
+INVOICE_BATCH_SIZE = 25
+
+EXPORT_FORMATS = ("zip", "pdf")
+
+# ---------------------- Invoice Rows ----------------------
+
+def get_invoice_rows(start_date, end_date):
+    """
+    Returns the SINGLE_INVOICE_QUERY rows of every reservation starting
+    between start_date and end_date (inclusive), fetched with one query and
+    ordered by start date.
+    """
+    start_day = to_day_number(start_date)
+    end_day = to_day_number(end_date)
+    conn = get_connection()
+    cursor = conn.cursor()
+    # EndDay >= StartDay, so the EndDay bound holds for every match and lets idx_Reservations_Days seek
+    cursor.execute(
+        SINGLE_INVOICE_QUERY + " WHERE r.EndDay >= ? AND r.StartDay BETWEEN ? AND ? ORDER BY r.StartDay, r.ReservationID",
+        (start_day, start_day, end_day)
+    )
+    return cursor.fetchall()
+
+def export_filename(start_date, end_date, export_format):
+    return f"invoices_{start_date}_to_{end_date}.{export_format}".replace("/", "-")
+
+# ---------------------- Pool Tasks ----------------------
+
+def render_invoice_batch(rows):
+    """
+    Renders a batch of invoices in a pool worker. Returns [(file name, pdf bytes), ...].
+    """
+    return [(f"invoice_{row[0]}.pdf", renderSingleVehicleInvoice(row).data) for row in rows]
+
+# ---------------------- Streaming ----------------------
+
+class _StreamSink(RawIOBase):
+    """
+    Write-only, unseekable file for ZipFile and ReportLab that buffers only
+    what was written since the last take().
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def stream_invoice_zip(rows):
+    """
+    Yields a ZIP of one PDF per row, batch by batch as the pool renders them.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for batch in job_queue.imap(render_invoice_batch, _batches(rows, INVOICE_BATCH_SIZE)):
+            for name, data in batch:
+                archive.writestr(name, data)
+            yield sink.take()
+    yield sink.take()
+
+def stream_merged_invoices(rows):
+    """
+    Yields one PDF holding every invoice, drawn by drawInvoice onto a single
+    ReportLab canvas with each invoice starting on a new page. Pages are
+    kept compressed until save() writes the file out.
+    """
+    sink = _StreamSink()
+    pdf = canvas.Canvas(sink, pagesize=letter, pageCompression=1)
+    pdf.setTitle("Invoices")
+    for row in rows:
+        drawInvoice(pdf, **singleVehicleInvoice(row))
+        pdf.showPage()
+    pdf.save()
+    yield sink.take()
+
+def export_invoices(rows, export_format):
+    """
+    Returns an iterator over the bytes of the export. ZIP entries are
+    rendered in parallel by the pool while it streams; the merged PDF is
+    drawn on one canvas when the first chunk is requested.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "zip":
+        return stream_invoice_zip(rows)
+    return stream_merged_invoices(rows)
+
+# ---------------------- Command Line ----------------------
+
+if __name__ == '__main__':
+    from database import init_db
+
+    parser = argparse.ArgumentParser(description="Export the invoice of every reservation starting in a date range.")
+    parser.add_argument("start_date", help="YYYY-MM-DD or MM/DD/YYYY")
+    parser.add_argument("end_date", help="YYYY-MM-DD or MM/DD/YYYY")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="zip", help="one PDF per invoice in a ZIP, or one merged PDF")
+    parser.add_argument("--output", help="defaults to invoices_<start>_to_<end>.<format>")
+    args = parser.parse_args()
+
+    init_db()
+    rows = get_invoice_rows(args.start_date, args.end_date)
+    output = args.output or export_filename(args.start_date, args.end_date, args.format)
+    with open(output, "wb") as f:
+        for chunk in export_invoices(rows, args.format):
+            f.write(chunk)
+    job_queue.shutdown()
+    print(f"Exported {len(rows)} invoices to {output}")
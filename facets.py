@@ -0,0 +1,136 @@
+# ---------------------- Imports and Constants ----------------------
+import threading
+from database import get_connection
+
+# Filter field name (as posted by the products page) -> Vehicles column
+FACETS = {
+    "type": "Type",
+    "make": "Make",
+    "model": "Model",
+    "drive": "DriveTrain",
+    "transmission": "Transmission",
+    "location": "LocationID",
+}
+
+FACET_COLUMNS = ", ".join(FACETS.values())
+
+def facet_key(value):
+    """
+    Normalises a facet value the way the LIKE filters compare them
+    (case-insensitive, surrounding whitespace ignored).
+    """
+    return str(value).strip().lower()
+
+# ---------------------- Facet Index ----------------------
+
+class FacetIndex:
+    """
+    In-process index of the distinct filter values in Vehicles.
+
+    For every facet it keeps {value key: set of VehicleIDs}, so the plain
+    per-value counts used for the filter dropdowns are precomputed, and
+    counts conditioned on the current filter (each facet restricted by the
+    *other* selected facets, as in faceted search) are a few set
+    intersections. Rows are refreshed one vehicle at a time when a vehicle
+    is inserted or updated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vehicles = {}
+        self._postings = {facet: {} for facet in FACETS}
+        self._values = {facet: {} for facet in FACETS}
+        self._counts = None
+        self.loaded = False
+
+    def load(self, conn=None):
+        """
+        Rebuilds the whole index from the Vehicles table.
+        """
+        conn = conn or get_connection()
+        rows = conn.execute(f"SELECT VehicleID, {FACET_COLUMNS} FROM Vehicles").fetchall()
+        with self._lock:
+            self._vehicles = {}
+            self._postings = {facet: {} for facet in FACETS}
+            self._values = {facet: {} for facet in FACETS}
+            for row in rows:
+                self._add(row[0], row[1:])
+            self._counts = None
+            self.loaded = True
+
+    def refresh_vehicle(self, vehicle_id, conn=None):
+        """
+        Re-reads one vehicle after it was inserted or updated.
+        """
+        if not self.loaded:
+            return
+        conn = conn or get_connection()
+        row = conn.execute(f"SELECT VehicleID, {FACET_COLUMNS} FROM Vehicles WHERE VehicleID = ?", (vehicle_id,)).fetchone()
+        with self._lock:
+            self._remove(int(vehicle_id))
+            if row:
+                self._add(row[0], row[1:])
+            self._counts = None
+
+    def _add(self, vehicle_id, values):
+        keys = {}
+        for facet, value in zip(FACETS, values):
+            if value is None or str(value).strip() == "":
+                continue
+            key = facet_key(value)
+            keys[facet] = key
+            self._postings[facet].setdefault(key, set()).add(vehicle_id)
+            self._values[facet].setdefault(key, str(value).strip())
+        self._vehicles[vehicle_id] = keys
+
+    def _remove(self, vehicle_id):
+        for facet, key in self._vehicles.pop(vehicle_id, {}).items():
+            vehicle_ids = self._postings[facet][key]
+            vehicle_ids.discard(vehicle_id)
+            if not vehicle_ids:
+                del self._postings[facet][key]
+                del self._values[facet][key]
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def counts(self):
+        """
+        Returns {facet: [(value, count), ...]} over every vehicle, sorted by value.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if self._counts is None:
+                self._counts = {
+                    facet: sorted(
+                        ((self._values[facet][key], len(vehicle_ids)) for key, vehicle_ids in postings.items()),
+                        key=lambda item: item[0].lower()
+                    )
+                    for facet, postings in self._postings.items()
+                }
+            return self._counts
+
+    def filtered_counts(self, filters):
+        """
+        Returns {facet: [(value, count), ...]} where each facet's counts only
+        include vehicles matching the other facets in `filters`
+        ({facet: selected value}, empty values ignored).
+        """
+        selected = {facet: facet_key(value) for facet, value in filters.items() if facet in FACETS and value}
+        if not selected:
+            return self.counts()
+        self._ensure_loaded()
+        with self._lock:
+            result = {}
+            for facet in FACETS:
+                others = [self._postings[other].get(key, set()) for other, key in selected.items() if other != facet]
+                matching = set.intersection(*others) if others else None
+                values = []
+                for key, vehicle_ids in self._postings[facet].items():
+                    count = len(vehicle_ids) if matching is None else len(vehicle_ids & matching)
+                    values.append((self._values[facet][key], count))
+                result[facet] = sorted(values, key=lambda item: item[0].lower())
+            return result
+
+facet_index = FacetIndex()
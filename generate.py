@@ -1,17 +1,165 @@
-from flask import make_response
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import simpleSplit
 from datetime import datetime
-import sqlite3
 from utils import *
+from database import get_connection
+from cache import pdf_cache
 from io import BytesIO
-
-
-def vehicleReport(start_date, end_date):
-    conn = sqlite3.connect("car_rental.db")
+from functools import partial
+from typing import Callable, NamedTuple
+
+# Part of every PDF cache key; bump it when a cached document's layout changes
+# so copies rendered with the old layout are not served again
+PDF_LAYOUT_VERSION = 1
+
+# Rows fetched per round trip while streaming a report
+REPORT_FETCH_SIZE = 500
+
+# Everything a single vehicle invoice is drawn from, one row per reservation
+SINGLE_INVOICE_QUERY = """
+    SELECT r.ReservationID, r.VehicleID, r.UserID, r.PlanID, r.ReserveStartDate,
+           r.ReserveEndDate, r.PickUpLocation, r.DropOffLocation, r.NumDays,
+           rp.Name, rp.Type, rp.Rate, v.Year || ' ' || v.Make || ' ' || v.Model AS VehicleName,
+           i.PaidAmount
+    FROM Reservations r
+    JOIN RentalPlans rp ON r.PlanID = rp.PlanID
+    JOIN Vehicles v ON r.VehicleID = v.VehicleID
+    JOIN Invoice i ON r.ReservationID = i.ReservationID
+"""
+
+
+class ReportNotFound(Exception):
+    """Raised when the reservation a document is built from does not exist."""
+
+
+class PDFDocument(NamedTuple):
+    """
+    A rendered document. data is the PDF bytes; key is its PDF cache key,
+    or None if it is not cached.
+    """
+    data: bytes
+    filename: str
+    key: str = None
+
+
+class DocumentSource(NamedTuple):
+    """
+    A cached document before it is rendered: its PDF cache key and filename,
+    known from the rows it is drawn from, and a function that draws it.
+    Lets callers serve a cache hit without queueing a render.
+    """
+    key: str
+    filename: str
+    render: Callable[[], bytes]
+
+    def document(self):
+        """Returns the PDFDocument, from the PDF cache or rendered and stored on a miss."""
+        return PDFDocument(cached_pdf(self.key, self.render), self.filename, self.key)
+
+
+def cached_pdf(key, render, *args, **kwargs):
+    """Returns the cached PDF for key, rendering and storing it on a miss."""
+    data = pdf_cache.get(key)
+    if data is None:
+        data = render(*args, **kwargs)
+        pdf_cache.put(key, data)
+    return data
+
+
+def vehicleReportPDF(start_date, end_date):
+    """
+    Renders the vehicle report, from a background job (jobs.py). Not cached:
+    it is stamped with the time it was generated.
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+    pdf.setTitle("Car Rental Report")
+    drawVehicleReport(PagedReport(pdf), start_date, end_date)
+    pdf.save()
+    return PDFDocument(buffer.getvalue(), f"vehicle_report_{start_date}_to_{end_date}.pdf")
+
+
+def fetch_in_chunks(cursor, size=REPORT_FETCH_SIZE):
+    """Iterates over a cursor's rows, fetching `size` rows per round trip."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+class PagedReport:
+    """
+    Flows lines of text down the pages of a ReportLab canvas. When a page is
+    full it is finished with a page number and showPage(), and the current
+    section heading is repeated at the top of the next one.
+    """
+
+    def __init__(self, pdf, top=750, bottom=60, line_height=15):
+        self.pdf = pdf
+        self.top = top
+        self.bottom = bottom
+        self.line_height = line_height
+        self.y = top
+        self.page_number = 1
+        self.section = None
+
+    def _number_page(self):
+        self.pdf.setFont("Helvetica", 10)
+        self.pdf.drawString(50, 30, f"Page {self.page_number}")
+
+    def _break_page(self):
+        self._number_page()
+        self.pdf.showPage()
+        self.page_number += 1
+        self.y = self.top
+        if self.section:
+            self._draw(f"{self.section} (continued)", 50, "Helvetica-Bold")
+
+    def _draw(self, text, x, font):
+        self.pdf.setFont(font, 12)
+        self.pdf.drawString(x, self.y, text)
+        self.y -= self.line_height
+
+    def line(self, text, x=50, bold=False):
+        if self.y < self.bottom:
+            self._break_page()
+        self._draw(text, x, "Helvetica-Bold" if bold else "Helvetica")
+
+    def heading(self, text):
+        """Starts a section; keeps at least one row under the heading on the same page."""
+        if self.y - self.line_height < self.bottom:
+            self.section = None
+            self._break_page()
+        self.section = text
+        self._draw(text, 50, "Helvetica-Bold")
+
+    def space(self, points):
+        self.y -= points
+
+    def close(self):
+        """Numbers the last page; the caller saves the canvas."""
+        self._number_page()
+
+
+def drawVehicleReport(report, start_date, end_date):
+    """
+    Draws the vehicle report onto a PagedReport. Rows are read from the
+    cursors in chunks, so only one chunk of the fleet is in Python at a time.
+    """
+    start_day = to_day_number(start_date)
+    end_day = to_day_number(end_date)
+
+    conn = get_connection()
     cursor = conn.cursor()
 
+    current_date = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+    report.line("Car Rental Report", bold=True)
+    report.line(f"Generated on: {current_date.replace('_', ' at ')}", bold=True)
+    report.line(f"Report Range: {start_date} to {end_date}", bold=True)
+    report.space(5)
+
     # Query for cars rented within the date range
     cursor.execute("""
         SELECT 
@@ -21,14 +169,11 @@ def vehicleReport(start_date, end_date):
             r.ReserveEndDate
         FROM Reservations r
         JOIN Vehicles v ON r.VehicleID = v.VehicleID
-        WHERE DATE(STRFTIME('%Y-%m-%d', SUBSTR(r.ReserveStartDate, 7, 4) || '-' || 
-                                        SUBSTR(r.ReserveStartDate, 1, 2) || '-' || 
-                                        SUBSTR(r.ReserveStartDate, 4, 2))) <= ? 
-        AND DATE(STRFTIME('%Y-%m-%d', SUBSTR(r.ReserveEndDate, 7, 4) || '-' || 
-                                        SUBSTR(r.ReserveEndDate, 1, 2) || '-' || 
-                                        SUBSTR(r.ReserveEndDate, 4, 2))) >= ?
-    """, (end_date, start_date))
-    rented_cars = cursor.fetchall()
+        WHERE r.StartDay <= ? AND r.EndDay >= ?
+    """, (end_day, start_day))
+    report.heading("Cars Currently Rented:")
+    for car in fetch_in_chunks(cursor):
+        report.line(f"Vehicle ID: {car[0]}, Name: {car[1]}, Rented From: {car[2]} - {car[3]}")
 
     # Query for cars in-house
     cursor.execute("""
@@ -36,20 +181,15 @@ def vehicleReport(start_date, end_date):
         FROM Vehicles v
         WHERE Available = 'Yes'
     """)
-    in_house_cars = cursor.fetchall()
+    report.heading("Cars In-House/Available For Rent:")
+    for car in fetch_in_chunks(cursor):
+        report.line(f"Vehicle ID: {car[0]}, Name: {car[1]}")
 
-    # Query for revenue within the date range
-    cursor.execute("""
-        SELECT SUM(r.TotalPrice) AS Revenue
-        FROM Reservations r
-        WHERE DATE(STRFTIME('%Y-%m-%d', SUBSTR(r.ReserveStartDate, 7, 4) || '-' || 
-                                            SUBSTR(r.ReserveStartDate, 1, 2) || '-' || 
-                                            SUBSTR(r.ReserveStartDate, 4, 2))) <= ? 
-        AND DATE(STRFTIME('%Y-%m-%d', SUBSTR(r.ReserveEndDate, 7, 4) || '-' || 
-                                            SUBSTR(r.ReserveEndDate, 1, 2) || '-' || 
-                                            SUBSTR(r.ReserveEndDate, 4, 2))) >= ?
-    """, (end_date, start_date))
-    revenue = cursor.fetchone()[0] or 0.0
+    # Revenue of the reservations overlapping the date range, from the daily rollups
+    revenue = get_range_revenue(start_day, end_day)
+    report.heading("Total Revenue Earned:")
+    report.line(f"${revenue:.2f}", x=200)
+    report.space(15)
 
     # Query for unavailable cars without reservations within the date range
     cursor.execute("""
@@ -59,68 +199,14 @@ def vehicleReport(start_date, end_date):
         AND v.VehicleID NOT IN (
             SELECT r.VehicleID
             FROM Reservations r
-            WHERE DATE(STRFTIME('%Y-%m-%d', SUBSTR(r.ReserveStartDate, 7, 4) || '-' || 
-                                            SUBSTR(r.ReserveStartDate, 1, 2) || '-' || 
-                                            SUBSTR(r.ReserveStartDate, 4, 2))) <= ? 
-            AND DATE(STRFTIME('%Y-%m-%d', SUBSTR(r.ReserveEndDate, 7, 4) || '-' || 
-                                            SUBSTR(r.ReserveEndDate, 1, 2) || '-' || 
-                                            SUBSTR(r.ReserveEndDate, 4, 2))) >= ?
+            WHERE r.StartDay <= ? AND r.EndDay >= ?
         )
-    """, (end_date, start_date))
-    unavailable_cars = cursor.fetchall()
-
-    conn.close()
-
-    # Generate the PDF
-    pdf_buffer = BytesIO()
-    pdf = canvas.Canvas(pdf_buffer, pagesize=letter)
-
-    current_date = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, 750, "Car Rental Report")
-    pdf.drawString(50, 735, f"Generated on: {current_date.replace('_', ' at ')}")
-    pdf.drawString(50, 720, f"Report Range: {start_date} to {end_date}")
-
-    y = 700
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "Cars Currently Rented:")
-    y -= 15
-    pdf.setFont("Helvetica", 12)
-    for car in rented_cars:
-        pdf.drawString(50, y, f"Vehicle ID: {car[0]}, Name: {car[1]}, Rented From: {car[2]} - {car[3]}")
-        y -= 15
-
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "Cars In-House/Available For Rent:")
-    y -= 15
-    pdf.setFont("Helvetica", 12)
-    for car in in_house_cars:
-        pdf.drawString(50, y, f"Vehicle ID: {car[0]}, Name: {car[1]}")
-        y -= 15
-
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "Total Revenue Earned:")
-    y -= 15
-    pdf.setFont("Helvetica", 12)
-    pdf.drawString(200, y, f"${revenue:.2f}")
-    y -= 30
-
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "Unavailable Cars Without Current Reservations:")
-    y -= 15
-    pdf.setFont("Helvetica", 12)
-    for car in unavailable_cars:
-        pdf.drawString(50, y, f"Vehicle ID: {car[0]}, Name: {car[1]}")
-        y -= 15
-
-    pdf.save()
-    pdf_buffer.seek(0)
+    """, (end_day, start_day))
+    report.heading("Unavailable Cars Without Current Reservations:")
+    for car in fetch_in_chunks(cursor):
+        report.line(f"Vehicle ID: {car[0]}, Name: {car[1]}")
 
-    response = make_response(pdf_buffer.getvalue())
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = f"attachment; filename=vehicle_report_{start_date}_to_{end_date}.pdf"
-
-    return response
+    report.close()
 
 
 def draw_wrapped_text(pdf, text, x, y, width=400, line_height=12):
@@ -131,8 +217,12 @@ def draw_wrapped_text(pdf, text, x, y, width=400, line_height=12):
         y -= line_height
     return y  # Return the new y-coordinate after wrapping
 
-def rentalAgreement(reservation_id):
-    conn = sqlite3.connect("car_rental.db")
+def rentalAgreementPDF(reservation_id):
+    return rentalAgreementSource(reservation_id).document()
+
+
+def rentalAgreementSource(reservation_id):
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Fetch reservation details
@@ -147,16 +237,23 @@ def rentalAgreement(reservation_id):
     """, (reservation_id,))
     reservation = cursor.fetchone()
 
+    if not reservation:
+        raise ReportNotFound("Reservation not found.")
+
     # Fetch pickup and dropoff location details
     cursor.execute("SELECT Address, Phone FROM Locations WHERE LocationID = ?", (reservation[6],))
     pickup_details = cursor.fetchone()
-    pickup_address, pickup_phone = pickup_details[0], pickup_details[1]
 
     cursor.execute("SELECT Address, Phone FROM Locations WHERE LocationID = ?", (reservation[7],))
     dropoff_details = cursor.fetchone()
+
+    key = pdf_cache.key("rental_agreement", PDF_LAYOUT_VERSION, reservation, pickup_details, dropoff_details)
+    return DocumentSource(key, f"rental_agreement_{reservation_id}.pdf", partial(drawRentalAgreement, reservation, pickup_details, dropoff_details))
+
+
+def drawRentalAgreement(reservation, pickup_details, dropoff_details):
+    pickup_address, pickup_phone = pickup_details[0], pickup_details[1]
     dropoff_address, dropoff_phone = dropoff_details[0], dropoff_details[1]
-    
-    conn.close()
 
     # Generate the PDF in-memory
     buffer = BytesIO()
@@ -229,18 +326,16 @@ def rentalAgreement(reservation_id):
 
     # Save the PDF
     pdf.save()
-    buffer.seek(0)
 
-    # Create a Flask response
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'inline; filename=rental_agreement_{reservation_id}.pdf'
-    
-    return response
+    return buffer.getvalue()
 
 
-def invoiceFromReservation(reservation_id):
-    conn = sqlite3.connect("car_rental.db")
+def invoiceFromReservationPDF(reservation_id):
+    return invoiceFromReservationSource(reservation_id).document()
+
+
+def invoiceFromReservationSource(reservation_id):
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Step 1: Find the CustomerID for the given ReservationID
@@ -252,8 +347,7 @@ def invoiceFromReservation(reservation_id):
     customer_data = cursor.fetchone()
 
     if not customer_data:
-        conn.close()
-        return "Reservation not found.", 404
+        raise ReportNotFound("Reservation not found.")
 
     customer_id = customer_data[0]
 
@@ -271,11 +365,15 @@ def invoiceFromReservation(reservation_id):
     """, (customer_id,))
     reservations = cursor.fetchall()
 
-    conn.close()
 
     if not reservations:
-        return "No reservations found for the customer.", 404
+        raise ReportNotFound("No reservations found for the customer.")
+
+    key = pdf_cache.key("invoice", PDF_LAYOUT_VERSION, customer_id, reservations)
+    return DocumentSource(key, invoiceFilename("Consolidated Invoice", customer_id), partial(renderConsolidatedInvoice, customer_id, reservations))
 
+
+def renderConsolidatedInvoice(customer_id, reservations):
     # Step 3: Calculate totals and prepare data for the PDF
     subtotal = 0
     admin_fee = 0
@@ -321,29 +419,43 @@ def invoiceFromReservation(reservation_id):
     )
 
 
-def invoiceForSingleVehicle(reservation_id):
-    conn = sqlite3.connect("car_rental.db")
+def invoiceForSingleVehiclePDF(reservation_id):
+    return invoiceForSingleVehicleSource(reservation_id).document()
+
+
+def invoiceForSingleVehicleSource(reservation_id):
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Step 1: Fetch reservation details for the given ReservationID, including paid amount
-    cursor.execute("""
-        SELECT r.ReservationID, r.VehicleID, r.UserID, r.PlanID, r.ReserveStartDate,
-               r.ReserveEndDate, r.PickUpLocation, r.DropOffLocation, r.NumDays,
-               rp.Name, rp.Type, rp.Rate, v.Year || ' ' || v.Make || ' ' || v.Model AS VehicleName,
-               i.PaidAmount
-        FROM Reservations r
-        JOIN RentalPlans rp ON r.PlanID = rp.PlanID
-        JOIN Vehicles v ON r.VehicleID = v.VehicleID
-        JOIN Invoice i ON r.ReservationID = i.ReservationID
-        WHERE r.ReservationID = ?
-    """, (reservation_id,))
+    cursor.execute(SINGLE_INVOICE_QUERY + " WHERE r.ReservationID = ?", (reservation_id,))
     reservation = cursor.fetchone()
 
-    conn.close()
 
     if not reservation:
-        return "Reservation not found.", 404
+        raise ReportNotFound("Reservation not found.")
+
+    return singleVehicleInvoiceSource(reservation)
+
+
+def singleVehicleInvoiceSource(reservation):
+    """Returns the DocumentSource of the invoice for one SINGLE_INVOICE_QUERY row."""
+    invoice = singleVehicleInvoice(reservation)
+    key = pdf_cache.key("vehicle_invoice", PDF_LAYOUT_VERSION, reservation)
+    return DocumentSource(key, invoiceFilename(invoice["title"], invoice["customer_id"]), partial(generatePDF, **invoice))
 
+
+def renderSingleVehicleInvoice(reservation):
+    """
+    Renders (or fetches from the PDF cache) the invoice for one
+    SINGLE_INVOICE_QUERY row. Needs no database, so bulk exports can call it
+    from pool workers.
+    """
+    return singleVehicleInvoiceSource(reservation).document()
+
+
+def singleVehicleInvoice(reservation):
+    """Returns the generatePDF/drawInvoice arguments for one SINGLE_INVOICE_QUERY row."""
     # Extract reservation details
     (reservation_id, vehicle_id, user_id, plan_id, reserve_start_date, reserve_end_date,
      pickup_location, dropoff_location, num_days, plan_name, plan_type, rate, vehicle_name, paid_amount) = reservation
@@ -369,8 +481,7 @@ def invoiceForSingleVehicle(reservation_id):
         "Dropoff": dropoff_location
     }]
 
-    # Generate the PDF
-    return generatePDF(
+    return dict(
         customer_id=user_id,
         reservations_data=reservations_data,
         subtotal=total_price,
@@ -383,11 +494,25 @@ def invoiceForSingleVehicle(reservation_id):
     )
 
 
+def invoiceFilename(title, customer_id):
+    return f"{title.replace(' ', '_').lower()}_{customer_id}.pdf"
+
+
 def generatePDF(customer_id, reservations_data, subtotal, admin_fee, tax, total, total_paid, remaining_balance, title):
+    """Renders an invoice and returns the PDF bytes."""
     buffer = BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=letter)
     pdf.setTitle(f"{title} - Customer #{customer_id}")
+    drawInvoice(pdf, customer_id, reservations_data, subtotal, admin_fee, tax, total, total_paid, remaining_balance, title)
+
+    # Save PDF
+    pdf.save()
+
+    return buffer.getvalue()
 
+
+def drawInvoice(pdf, customer_id, reservations_data, subtotal, admin_fee, tax, total, total_paid, remaining_balance, title):
+    """Draws an invoice onto the canvas, starting on its current page."""
     # Title
     pdf.setFont("Helvetica-Bold", 16)
     pdf.drawString(50, 750, f"{title} for Customer #{customer_id}")
@@ -463,14 +588,4 @@ def generatePDF(customer_id, reservations_data, subtotal, admin_fee, tax, total,
     pdf.drawString(50, y, "_" * 80)  # Separator line
 
     # Footer
-    pdf.drawString(50, 100, "Thank you for renting with us!")
-
-    # Save PDF
-    pdf.save()
-    buffer.seek(0)
-
-    # Create Flask Response
-    response = make_response(buffer.getvalue())
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = f"inline; filename={title.replace(' ', '_').lower()}_{customer_id}.pdf"
-    return response
\ No newline at end of file
+    pdf.drawString(50, 100, "Thank you for renting with us!")
\ No newline at end of file
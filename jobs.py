@@ -0,0 +1,258 @@
+# ---------------------- Imports and Constants ----------------------
+import json
+import multiprocessing
+import os
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+import database
+from generate import (
+    ReportNotFound, vehicleReportPDF, rentalAgreementPDF, invoiceFromReservationPDF, invoiceForSingleVehiclePDF,
+    rentalAgreementSource, invoiceFromReservationSource, invoiceForSingleVehicleSource
+)
+
+# Job records (<job id>.json) and the PDFs of uncached documents (<job id>.pdf);
+# cached documents are downloaded from the PDF cache instead
+REPORT_DIR = 'reports'
+
+# Render in worker processes so ReportLab runs on every core instead of
+# sharing the web process's GIL; REPORT_PROCESSES = False uses threads.
+# Workers are spawned, which re-imports the main module: scripts that start
+# the app must keep app.run() under `if __name__ == '__main__'`.
+REPORT_WORKERS = min(4, os.cpu_count() or 1)
+REPORT_PROCESSES = True
+
+# Finished results older than this many seconds are deleted by purge_expired(),
+# which runs at start-up and then from submit() at most every REPORT_PURGE_INTERVAL seconds
+REPORT_MAX_AGE = 24 * 60 * 60
+REPORT_PURGE_INTERVAL = 60 * 60
+
+# Job kind -> (renderer, [(form field, type), ...]). Renderers return a PDFDocument.
+REPORT_KINDS = {
+    "vehicle_report": (vehicleReportPDF, [("startDate", str), ("endDate", str)]),
+    "rental_agreement": (rentalAgreementPDF, [("reservation_id", int)]),
+    "invoice": (invoiceFromReservationPDF, [("reservation_id", int)]),
+    "vehicle_invoice": (invoiceForSingleVehiclePDF, [("reservation_id", int)]),
+}
+
+# Kinds kept in the PDF cache -> function returning their DocumentSource, so a
+# cached copy can be served without queueing a render
+CACHED_REPORTS = {
+    "rental_agreement": rentalAgreementSource,
+    "invoice": invoiceFromReservationSource,
+    "vehicle_invoice": invoiceForSingleVehicleSource,
+}
+
+# Kinds only admins (Usertype 1) may request
+ADMIN_REPORTS = {"vehicle_report"}
+
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+# ---------------------- Worker Side ----------------------
+
+def _init_worker(db_path):
+    database.db_path = db_path
+
+def render_job(kind, args, path):
+    """
+    Runs in a pool worker: renders one document and returns (download
+    filename, PDF cache key). A cached document is already stored in the PDF
+    cache; any other is written to `path` under a temporary name and moved
+    into place, so a result that exists is always complete.
+    """
+    try:
+        document = REPORT_KINDS[kind][0](*args)
+        if document.key is None:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(document.data)
+            os.replace(temp_path, path)
+    finally:
+        database.close_thread_connection()
+    return document.filename, document.key
+
+# ---------------------- Job Queue ----------------------
+
+class JobQueue:
+    """
+    Background PDF render queue. Each job's record is kept as JSON next to
+    its result in `directory`, so any web worker sharing the directory can
+    answer status and download requests; the pool itself is created on the
+    first submit.
+    """
+
+    def __init__(self, directory=REPORT_DIR, workers=REPORT_WORKERS, processes=REPORT_PROCESSES):
+        self.directory = directory
+        self.workers = workers
+        self.processes = processes
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = {}
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0}
+        self._last_purge = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    # spawn: forked children would share the parent's pooled SQLite connections
+                    self._executor = ProcessPoolExecutor(
+                        self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(os.path.abspath(database.db_path),)
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="report")
+            return self._executor
+
+    def _path(self, job_id, extension):
+        return os.path.join(self.directory, f"{job_id}.{extension}")
+
+    def _write_record(self, job):
+        path = self._path(job["job_id"], "json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(job, f)
+        os.replace(f"{path}.tmp", path)
+
+    def submit(self, kind, args, user_id=None):
+        """
+        Queues a document of the given kind and returns its job record.
+        """
+        if kind not in REPORT_KINDS:
+            raise ValueError(f"Unknown report kind: {kind}")
+        job = {
+            "job_id": secrets.token_hex(16),
+            "kind": kind,
+            "args": list(args),
+            "user_id": user_id,
+            "status": "queued",
+            "filename": None,
+            "key": None,
+            "error": None,
+            "created": time.time(),
+            "finished": None,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        self._purge_if_due()
+        self._write_record(job)
+        task = (render_job, kind, tuple(args), os.path.abspath(self._path(job["job_id"], "pdf")))
+        try:
+            try:
+                future = self._get_executor().submit(*task)
+            except BrokenExecutor:
+                # A worker died (e.g. killed by the OS); start a fresh pool
+                self.shutdown(wait=False)
+                future = self._get_executor().submit(*task)
+        except Exception:
+            os.remove(self._path(job["job_id"], "json"))
+            raise
+        with self._lock:
+            self._futures[job["job_id"]] = future
+            self._stats["submitted"] += 1
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _finish(self, job, future):
+        try:
+            job["filename"], job["key"] = future.result()
+            job["status"] = "done"
+        except ReportNotFound as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        except Exception as e:
+            print(f"Error rendering {job['kind']} job {job['job_id']}: {e}")
+            job["status"] = "failed"
+            job["error"] = "Failed to generate the document"
+        job["finished"] = time.time()
+        self._write_record(job)
+        with self._lock:
+            self._futures.pop(job["job_id"], None)
+            self._stats["completed" if job["status"] == "done" else "failed"] += 1
+
+    def status(self, job_id):
+        """
+        Returns the job record, or None for an unknown job ID.
+        """
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, "json")) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            future = self._futures.get(job_id)
+        if job["status"] == "queued" and future is not None and future.running():
+            job["status"] = "running"
+        return job
+
+    def imap(self, fn, items, window=None):
+        """
+        Runs fn over items on the pool and yields the results in order,
+        keeping at most `window` calls in flight so results are never
+        produced much faster than the caller consumes them.
+        """
+        window = window or self.workers * 2
+        executor = self._get_executor()
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # The consumer stopped early (e.g. the client went away)
+            for future in pending:
+                future.cancel()
+
+    def result_path(self, job_id):
+        return self._path(job_id, "pdf")
+
+    def _purge_if_due(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_purge < REPORT_PURGE_INTERVAL:
+                return
+            self._last_purge = now
+        try:
+            self.purge_expired()
+        except OSError as e:
+            print(f"Error purging old report jobs: {e}")
+
+    def purge_expired(self, max_age=REPORT_MAX_AGE):
+        """
+        Deletes job records and results older than max_age seconds. Returns
+        the number of files removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Purged by another web worker sharing the directory
+                pass
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._futures), workers=self.workers, processes=self.processes)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+job_queue = JobQueue()
@@ -0,0 +1,473 @@
+# ---------------------- Imports and Constants ----------------------
+import sys
+from datetime import datetime
+
+def _day_number_sql(column):
+    """
+    SQL expression turning a MM/DD/YYYY text column into a julian day number.
+    Must agree with sqlQueries.to_day_number().
+    """
+    return (
+        f"CAST(julianday(substr(trim({column}), 7, 4) || '-' || "
+        f"substr(trim({column}), 1, 2) || '-' || substr(trim({column}), 4, 2)) AS INTEGER)"
+    )
+
+def _paid_sql(reservation_id):
+    """
+    SQL expression for the amount paid so far on a reservation's invoice
+    (Invoice.PaidAmount is stored as text).
+    """
+    return f"(SELECT COALESCE(SUM(CAST(PaidAmount AS REAL)), 0) FROM Invoice WHERE ReservationID = {reservation_id})"
+
+def _rollup_day(day, start_day, end_day):
+    """
+    SQL expression for a rollup day of a reservation: reservations with an
+    unparseable start or end date are counted entirely under day 0, where
+    what they add and remove cancels out for any real date range.
+    """
+    return f"CASE WHEN {start_day} IS NULL OR {end_day} IS NULL THEN 0 ELSE {day} END"
+
+def _rollup_reservation_sql(row, sign):
+    """
+    Statements adding (sign '+') or removing (sign '-') one reservation's
+    contribution to the rollup tables; row is NEW or OLD in a trigger.
+    It counts on its start day, and on the day after its end it stops
+    renting (RentalChange) and earning (EndedRevenue).
+    """
+    undo = "-" if sign == "+" else "+"
+    start, end = _day_number_sql(f'{row}.ReserveStartDate'), _day_number_sql(f'{row}.ReserveEndDate')
+    start_day, after_end = _rollup_day(start, start, end), _rollup_day(f"{end} + 1", start, end)
+    revenue = f"COALESCE({row}.TotalPrice, 0)"
+    values = f"{sign}1, {sign}{revenue}, {sign}{_paid_sql(f'{row}.ReservationID')}"
+    totals = (
+        "Reservations = Reservations + excluded.Reservations, Revenue = Revenue + excluded.Revenue, "
+        "PaidAmount = PaidAmount + excluded.PaidAmount, RentalChange = RentalChange + excluded.RentalChange"
+    )
+    return f"""
+            INSERT INTO VehicleDailyRollup (Day, VehicleID, LocationID, Reservations, Revenue, PaidAmount, RentalChange)
+            VALUES ({start_day}, {row}.VehicleID, {row}.PickUpLocation, {values}, {sign}1)
+            ON CONFLICT (Day, VehicleID, LocationID) DO UPDATE SET {totals};
+            INSERT INTO VehicleDailyRollup (Day, VehicleID, LocationID, Reservations, Revenue, PaidAmount, RentalChange)
+            VALUES ({after_end}, {row}.VehicleID, {row}.PickUpLocation, 0, 0, 0, {undo}1)
+            ON CONFLICT (Day, VehicleID, LocationID) DO UPDATE SET RentalChange = RentalChange + excluded.RentalChange;
+            INSERT INTO DailyRollup (Day, Reservations, Revenue, PaidAmount, RentalChange, EndedRevenue)
+            VALUES ({start_day}, {values}, {sign}1, 0)
+            ON CONFLICT (Day) DO UPDATE SET {totals};
+            INSERT INTO DailyRollup (Day, Reservations, Revenue, PaidAmount, RentalChange, EndedRevenue)
+            VALUES ({after_end}, 0, 0, 0, {undo}1, {sign}{revenue})
+            ON CONFLICT (Day) DO UPDATE SET RentalChange = RentalChange + excluded.RentalChange,
+                EndedRevenue = EndedRevenue + excluded.EndedRevenue;"""
+
+def _rollup_payment_sql(row, sign):
+    """
+    Statements moving one invoice's PaidAmount into or out of the rollup
+    rows of its reservation; row is NEW or OLD in a trigger on Invoice.
+    """
+    day = _rollup_day("StartDay", "StartDay", "EndDay")
+    reservation = f"FROM Reservations WHERE ReservationID = {row}.ReservationID"
+    amount = f"{sign}CAST({row}.PaidAmount AS REAL)"
+    return f"""
+            UPDATE VehicleDailyRollup SET PaidAmount = PaidAmount {amount}
+            WHERE (Day, VehicleID, LocationID) = (SELECT {day}, VehicleID, PickUpLocation {reservation});
+            UPDATE DailyRollup SET PaidAmount = PaidAmount {amount}
+            WHERE Day = (SELECT {day} {reservation});"""
+
+def rebuild_rollups(conn):
+    """
+    Recomputes VehicleDailyRollup and DailyRollup from Reservations and
+    Invoice. Run inside a transaction; returns the number of rows written
+    to VehicleDailyRollup.
+    """
+    start_day = _rollup_day("r.StartDay", "r.StartDay", "r.EndDay")
+    after_end = _rollup_day("EndDay + 1", "StartDay", "EndDay")
+    conn.execute("DELETE FROM VehicleDailyRollup")
+    conn.execute("DELETE FROM DailyRollup")
+    conn.execute(
+        f'''
+        INSERT INTO VehicleDailyRollup (Day, VehicleID, LocationID, Reservations, Revenue, PaidAmount, RentalChange)
+        SELECT {start_day}, r.VehicleID, r.PickUpLocation, COUNT(*), SUM(COALESCE(r.TotalPrice, 0)),
+               SUM(COALESCE(p.Paid, 0)), COUNT(*)
+        FROM Reservations r
+        LEFT JOIN (
+            SELECT ReservationID, SUM(CAST(PaidAmount AS REAL)) AS Paid FROM Invoice GROUP BY ReservationID
+        ) p ON p.ReservationID = r.ReservationID
+        GROUP BY 1, r.VehicleID, r.PickUpLocation
+        '''
+    )
+    conn.execute(
+        f'''
+        INSERT INTO VehicleDailyRollup (Day, VehicleID, LocationID, Reservations, Revenue, PaidAmount, RentalChange)
+        SELECT {after_end}, VehicleID, PickUpLocation, 0, 0, 0, -COUNT(*)
+        FROM Reservations WHERE 1 GROUP BY 1, VehicleID, PickUpLocation
+        ON CONFLICT (Day, VehicleID, LocationID) DO UPDATE SET RentalChange = RentalChange + excluded.RentalChange
+        '''
+    )
+    conn.execute(
+        '''
+        INSERT INTO DailyRollup (Day, Reservations, Revenue, PaidAmount, RentalChange, EndedRevenue)
+        SELECT Day, SUM(Reservations), SUM(Revenue), SUM(PaidAmount), SUM(RentalChange), 0
+        FROM VehicleDailyRollup GROUP BY Day
+        '''
+    )
+    conn.execute(
+        f'''
+        INSERT INTO DailyRollup (Day, Reservations, Revenue, PaidAmount, RentalChange, EndedRevenue)
+        SELECT {after_end}, 0, 0, 0, 0, SUM(COALESCE(TotalPrice, 0))
+        FROM Reservations WHERE 1 GROUP BY 1
+        ON CONFLICT (Day) DO UPDATE SET EndedRevenue = excluded.EndedRevenue
+        '''
+    )
+    return conn.execute("SELECT COUNT(*) FROM VehicleDailyRollup").fetchone()[0]
+
+# Each migration is (version, description, steps). A step is either a SQL
+# statement or a callable taking the connection. Versions must only ever be
+# appended; applied versions are recorded in the SchemaVersion table.
+MIGRATIONS = [
+    (1, "Secondary indexes for hot lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_Reservations_VehicleID ON Reservations (VehicleID, ReserveStartDate, ReserveEndDate)",
+        "CREATE INDEX IF NOT EXISTS idx_Reservations_CustomerID ON Reservations (CustomerID, PickedUp)",
+        "CREATE INDEX IF NOT EXISTS idx_Reservations_Status ON Reservations (PickedUp, DroppedOff)",
+        "CREATE INDEX IF NOT EXISTS idx_Invoice_ReservationID ON Invoice (ReservationID, InvoiceID, PaidAmount, PaymentStatus)",
+        "CREATE INDEX IF NOT EXISTS idx_Customers_Email ON Customers (Email)",
+        "CREATE INDEX IF NOT EXISTS idx_Users_Email ON Users (Email)",
+        "CREATE INDEX IF NOT EXISTS idx_RentalPlans_Type ON RentalPlans (Type, PlanID, Rate)",
+    ]),
+    (2, "Day-number reservation date columns", [
+        "ALTER TABLE Reservations ADD COLUMN StartDay INTEGER",
+        "ALTER TABLE Reservations ADD COLUMN EndDay INTEGER",
+        f"UPDATE Reservations SET StartDay = {_day_number_sql('ReserveStartDate')}, EndDay = {_day_number_sql('ReserveEndDate')}",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Days_Insert AFTER INSERT ON Reservations
+        BEGIN
+            UPDATE Reservations
+            SET StartDay = {_day_number_sql('NEW.ReserveStartDate')}, EndDay = {_day_number_sql('NEW.ReserveEndDate')}
+            WHERE ReservationID = NEW.ReservationID;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Days_Update AFTER UPDATE OF ReserveStartDate, ReserveEndDate ON Reservations
+        BEGIN
+            UPDATE Reservations
+            SET StartDay = {_day_number_sql('NEW.ReserveStartDate')}, EndDay = {_day_number_sql('NEW.ReserveEndDate')}
+            WHERE ReservationID = NEW.ReservationID;
+        END
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_Reservations_VehicleDays ON Reservations (VehicleID, StartDay, EndDay)",
+        "CREATE INDEX IF NOT EXISTS idx_Reservations_Days ON Reservations (EndDay, StartDay)",
+    ]),
+    (3, "Case-insensitive indexes for the vehicle filters", [
+        "CREATE INDEX IF NOT EXISTS idx_Vehicles_Type ON Vehicles (Type COLLATE NOCASE, Make COLLATE NOCASE, Model COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_Vehicles_Make ON Vehicles (Make COLLATE NOCASE, Model COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_Vehicles_LocationID ON Vehicles (LocationID)",
+    ]),
+    (4, "Full-text search over vehicle text columns", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS VehicleSearch USING fts5(
+            Make, Model, KeyFeatures, Description,
+            content='Vehicles', content_rowid='VehicleID', tokenize='porter unicode61'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_VehicleSearch_Insert AFTER INSERT ON Vehicles
+        BEGIN
+            INSERT INTO VehicleSearch (rowid, Make, Model, KeyFeatures, Description)
+            VALUES (NEW.VehicleID, NEW.Make, NEW.Model, NEW.KeyFeatures, NEW.Description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_VehicleSearch_Delete AFTER DELETE ON Vehicles
+        BEGIN
+            INSERT INTO VehicleSearch (VehicleSearch, rowid, Make, Model, KeyFeatures, Description)
+            VALUES ('delete', OLD.VehicleID, OLD.Make, OLD.Model, OLD.KeyFeatures, OLD.Description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_VehicleSearch_Update AFTER UPDATE OF Make, Model, KeyFeatures, Description ON Vehicles
+        BEGIN
+            INSERT INTO VehicleSearch (VehicleSearch, rowid, Make, Model, KeyFeatures, Description)
+            VALUES ('delete', OLD.VehicleID, OLD.Make, OLD.Model, OLD.KeyFeatures, OLD.Description);
+            INSERT INTO VehicleSearch (rowid, Make, Model, KeyFeatures, Description)
+            VALUES (NEW.VehicleID, NEW.Make, NEW.Model, NEW.KeyFeatures, NEW.Description);
+        END
+        """,
+        "INSERT INTO VehicleSearch (VehicleSearch) VALUES ('rebuild')",
+    ]),
+    (5, "Vehicle row versions and catalog version", [
+        "ALTER TABLE Vehicles ADD COLUMN RowVersion INTEGER NOT NULL DEFAULT 0",
+        """
+        CREATE TABLE IF NOT EXISTS CatalogVersion (
+            ID INTEGER PRIMARY KEY CHECK (ID = 1),
+            Version INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO CatalogVersion (ID, Version) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_Vehicles_Version_Insert AFTER INSERT ON Vehicles
+        BEGIN
+            UPDATE CatalogVersion SET Version = Version + 1 WHERE ID = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_Vehicles_Version_Update AFTER UPDATE ON Vehicles
+        WHEN NEW.RowVersion = OLD.RowVersion
+        BEGIN
+            UPDATE Vehicles SET RowVersion = OLD.RowVersion + 1 WHERE VehicleID = NEW.VehicleID;
+            UPDATE CatalogVersion SET Version = Version + 1 WHERE ID = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_Vehicles_Version_Delete AFTER DELETE ON Vehicles
+        BEGIN
+            UPDATE CatalogVersion SET Version = Version + 1 WHERE ID = 1;
+        END
+        """,
+    ]),
+    (6, "Reservations version for reserved-date caching", [
+        "ALTER TABLE CatalogVersion ADD COLUMN ReservationsVersion INTEGER NOT NULL DEFAULT 0",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Version_Insert AFTER INSERT ON Reservations
+        BEGIN
+            UPDATE CatalogVersion SET ReservationsVersion = ReservationsVersion + 1 WHERE ID = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Version_Update AFTER UPDATE OF VehicleID, ReserveStartDate, ReserveEndDate ON Reservations
+        BEGIN
+            UPDATE CatalogVersion SET ReservationsVersion = ReservationsVersion + 1 WHERE ID = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Version_Delete AFTER DELETE ON Reservations
+        BEGIN
+            UPDATE CatalogVersion SET ReservationsVersion = ReservationsVersion + 1 WHERE ID = 1;
+        END
+        """,
+    ]),
+    (7, "Server-side shopping carts", [
+        """
+        CREATE TABLE IF NOT EXISTS CartItems (
+            CartItemID INTEGER PRIMARY KEY AUTOINCREMENT,
+            CartID TEXT NOT NULL,
+            VehicleID INTEGER NOT NULL REFERENCES Vehicles (VehicleID),
+            StartDate TEXT NOT NULL,
+            EndDate TEXT NOT NULL,
+            NumDays INTEGER NOT NULL,
+            LineTotal REAL NOT NULL,
+            UpdatedOn REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_CartItems_CartID ON CartItems (CartID, CartItemID)",
+        "CREATE INDEX IF NOT EXISTS idx_CartItems_UpdatedOn ON CartItems (UpdatedOn)",
+    ]),
+    (8, "Server-side sessions", [
+        """
+        CREATE TABLE IF NOT EXISTS Sessions (
+            SessionID TEXT PRIMARY KEY,
+            UserID INTEGER,
+            Data TEXT NOT NULL,
+            Expires REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_Sessions_UserID ON Sessions (UserID)",
+        "CREATE INDEX IF NOT EXISTS idx_Sessions_Expires ON Sessions (Expires)",
+    ]),
+    # Each reservation is counted on its start day, under its vehicle and pick-up
+    # location. On the day after it ends, RentalChange drops by one and its
+    # revenue is added to EndedRevenue, so a running total of RentalChange is
+    # the number of rentals out on a day, and the revenue of every reservation
+    # overlapping a range is (started up to its end) - (ended before its start).
+    (9, "Daily revenue and utilization rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS VehicleDailyRollup (
+            Day INTEGER NOT NULL,
+            VehicleID INTEGER NOT NULL,
+            LocationID INTEGER NOT NULL,
+            Reservations INTEGER NOT NULL DEFAULT 0,
+            Revenue REAL NOT NULL DEFAULT 0,
+            PaidAmount REAL NOT NULL DEFAULT 0,
+            RentalChange INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (Day, VehicleID, LocationID)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS DailyRollup (
+            Day INTEGER PRIMARY KEY,
+            Reservations INTEGER NOT NULL DEFAULT 0,
+            Revenue REAL NOT NULL DEFAULT 0,
+            PaidAmount REAL NOT NULL DEFAULT 0,
+            RentalChange INTEGER NOT NULL DEFAULT 0,
+            EndedRevenue REAL NOT NULL DEFAULT 0
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Rollup_Insert AFTER INSERT ON Reservations
+        BEGIN{_rollup_reservation_sql('NEW', '+')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Rollup_Update
+        AFTER UPDATE OF VehicleID, PickUpLocation, ReserveStartDate, ReserveEndDate, TotalPrice ON Reservations
+        BEGIN{_rollup_reservation_sql('OLD', '-')}{_rollup_reservation_sql('NEW', '+')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Reservations_Rollup_Delete AFTER DELETE ON Reservations
+        BEGIN{_rollup_reservation_sql('OLD', '-')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Invoice_Rollup_Insert AFTER INSERT ON Invoice
+        BEGIN{_rollup_payment_sql('NEW', '+')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Invoice_Rollup_Update AFTER UPDATE OF ReservationID, PaidAmount ON Invoice
+        BEGIN{_rollup_payment_sql('OLD', '-')}{_rollup_payment_sql('NEW', '+')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_Invoice_Rollup_Delete AFTER DELETE ON Invoice
+        BEGIN{_rollup_payment_sql('OLD', '-')}
+        END
+        """,
+        rebuild_rollups,
+    ]),
+]
+
+# ---------------------- Migration Runner ----------------------
+
+def get_schema_version(conn):
+    """
+    Returns the highest applied migration version, or 0 for a fresh database.
+    """
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS SchemaVersion (
+            Version INTEGER PRIMARY KEY,
+            Description TEXT NOT NULL,
+            AppliedOn TEXT NOT NULL
+        )
+        '''
+    )
+    return conn.execute("SELECT COALESCE(MAX(Version), 0) FROM SchemaVersion").fetchone()[0]
+
+def migrate(conn):
+    """
+    Applies every pending migration in order, each in its own transaction.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    current = get_schema_version(conn)
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO SchemaVersion (Version, Description, AppliedOn) VALUES (?, ?, ?)",
+                (version, description, datetime.now().strftime("%m/%d/%Y %H:%M:%S"))
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error applying migration {version}: {e}")
+            raise
+        applied.append(version)
+    return applied
+
+# ---------------------- Query Plan Check ----------------------
+
+def hot_queries():
+    """
+    The query helpers on hot request paths, with sample arguments. Reference
+    table lookups are left out: they are served from reference_cache and
+    only read their (tiny) tables whole on a miss.
+    """
+    import sqlQueries
+    import cart
+    import sessions
+    import exports
+    return [
+        (cart.get_cart_items, ("0" * 32,)),
+        (sessions.session_store.backend.get, ("0" * 43,)),
+        (sqlQueries.get_user, ("admin@admin.com",)),
+        (sqlQueries.get_reserved_dates, (1,)),
+        (sqlQueries.get_reserved_days, (1, 2460000)),
+        (sqlQueries.get_reservations_tableData, ()),
+        (sqlQueries.get_reservations_tableData, (5, True)),
+        (sqlQueries.get_customer_tableData, ("admin@admin.com",)),
+        (sqlQueries.get_reservationid_by_customerid, (1, 1, "01/01/2025", "01/02/2025")),
+        (sqlQueries.get_invoiceid_by_reservationid, (1,)),
+        (sqlQueries.get_invoice_PaidAmount, (1,)),
+        (sqlQueries.get_payment_status, (1,)),
+        (sqlQueries.get_customerid_by_email, ("admin@admin.com",)),
+        (sqlQueries.get_emailData_by_customerid, (1,)),
+        (sqlQueries.get_vehicle_by_id, (1,)),
+        (sqlQueries.get_catalog_version, ()),
+        (sqlQueries.get_reservations_version, ()),
+        (exports.get_invoice_rows, ("2024-11-01", "2024-11-30")),
+        (sqlQueries.get_range_revenue, (2460600, 2460630)),
+        (sqlQueries.get_rollup, ("2024-11-01", "2024-11-30", "type")),
+        (sqlQueries.filter_vehicles, ("Sedan", "", "", "", "", "")),
+        (sqlQueries.filter_vehicles, ("", ["Toyota", "Honda"], "", "", "", "")),
+        (sqlQueries.filter_vehicles, ("", "", "", "", "", "10")),
+        (sqlQueries.filter_vehicles, ("SUV", "", "", "", "", "", "spacious family")),
+    ]
+
+def check_query_plans(conn):
+    """
+    Runs every hot query helper, captures the SQL it actually sends and runs
+    EXPLAIN QUERY PLAN on it. Returns a list of (function, sql, plan detail)
+    for each full table scan found; an empty list means every lookup is indexed.
+    """
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        captured = []
+        for function, args in hot_queries():
+            del statements[:]
+            function(*args)
+            # FTS5 reads its shadow tables with its own 'main'.'<table>' statements; skip those
+            captured += [
+                (function.__name__, sql) for sql in statements
+                if sql.lstrip().upper().startswith("SELECT") and "'main'." not in sql
+            ]
+    finally:
+        conn.set_trace_callback(None)
+
+    scans = []
+    for name, sql in captured:
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+            detail = row[-1]
+            # "SCAN <fts table> VIRTUAL TABLE INDEX 0:M..." is an FTS5 MATCH lookup, not a table scan
+            if detail.startswith("SCAN ") and "CONSTANT ROW" not in detail and ":M" not in detail:
+                scans.append((name, " ".join(sql.split()), detail))
+    return scans
+
+# ---------------------- Command Line ----------------------
+
+if __name__ == '__main__':
+    from database import init_db, get_connection
+
+    init_db()
+    conn = get_connection()
+    print(f"Schema version: {get_schema_version(conn)}")
+
+    if "--rebuild-rollups" in sys.argv:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = rebuild_rollups(conn)
+        conn.commit()
+        print(f"Rebuilt rollups: {rows} rows")
+
+    if "--check" in sys.argv:
+        scans = check_query_plans(conn)
+        for name, sql, detail in scans:
+            print(f"{name}: {detail}\n    {sql}")
+        if scans:
+            sys.exit(f"{len(scans)} hot queries regressed to a full table scan")
+        print("All hot queries use an index")
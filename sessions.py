@@ -0,0 +1,236 @@
+# ---------------------- Imports and Constants ----------------------
+import secrets
+import time
+from abc import ABC, abstractmethod
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from database import get_connection
+from cache import LRUCache
+
+# Idle sessions are forgotten after this many seconds. Requests that only
+# read the session push the expiry forward once less than half is left.
+SESSION_LIFETIME = 7 * 24 * 60 * 60
+
+# The in-memory front keeps this many sessions, each trusted for
+# SESSION_CACHE_TTL seconds before being re-read from the backing store, so
+# a revocation made by another worker takes effect within that window
+SESSION_CACHE_SIZE = 1024
+SESSION_CACHE_TTL = 5
+
+serializer = TaggedJSONSerializer()
+
+# ---------------------- Session Stores ----------------------
+
+class SessionStore(ABC):
+    """
+    Backing store interface: session data is kept as serialized text under
+    an opaque session ID, tagged with the UserID so every session of a user
+    can be revoked at once.
+    """
+
+    @abstractmethod
+    def get(self, session_id):
+        """Returns (serialized session data, expiry time), or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, session_id, data, user_id, expires):
+        pass
+
+    @abstractmethod
+    def touch(self, session_id, expires):
+        """Moves the expiry time of an unchanged session."""
+
+    @abstractmethod
+    def delete(self, session_id):
+        pass
+
+    @abstractmethod
+    def delete_user(self, user_id):
+        """Revokes every session belonging to user_id."""
+
+    @abstractmethod
+    def purge_expired(self):
+        pass
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions table in car_rental.db (see migration 8).
+    """
+
+    def get(self, session_id):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT Data, Expires FROM Sessions WHERE SessionID = ? AND Expires > ?", (session_id, time.time()))
+        data = cursor.fetchone()
+        return tuple(data) if data else None
+
+    def set(self, session_id, data, user_id, expires):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO Sessions (SessionID, UserID, Data, Expires) VALUES (?, ?, ?, ?)",
+            (session_id, user_id, data, expires)
+        )
+        conn.commit()
+
+    def touch(self, session_id, expires):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE Sessions SET Expires = ? WHERE SessionID = ?", (expires, session_id))
+        conn.commit()
+
+    def delete(self, session_id):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM Sessions WHERE SessionID = ?", (session_id,))
+        conn.commit()
+
+    def delete_user(self, user_id):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM Sessions WHERE UserID = ?", (user_id,))
+        conn.commit()
+
+    def purge_expired(self):
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM Sessions WHERE Expires <= ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+class CachedSessionStore(SessionStore):
+    """
+    In-memory LRU front for another store. Reads are served from memory for
+    up to `ttl` seconds; writes and deletes go straight through.
+    """
+
+    def __init__(self, backend, maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize)
+
+    def get(self, session_id):
+        entry = self._cache.get(session_id)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        record = self.backend.get(session_id)
+        if record is not None:
+            self._cache.put(session_id, (now + self.ttl, record))
+        return record
+
+    def set(self, session_id, data, user_id, expires):
+        self.backend.set(session_id, data, user_id, expires)
+        self._cache.put(session_id, (time.monotonic() + self.ttl, (data, expires)))
+
+    def touch(self, session_id, expires):
+        self.backend.touch(session_id, expires)
+        entry = self._cache.get(session_id)
+        if entry is not None:
+            self._cache.put(session_id, (entry[0], (entry[1][0], expires)))
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+        self._cache.invalidate(session_id)
+
+    def delete_user(self, user_id):
+        """
+        Revokes the user's sessions in the backing store and in this
+        process's cache. Other processes keep their own cache, so they may
+        still accept a revoked session for up to `ttl` seconds.
+        """
+        self.backend.delete_user(user_id)
+        # Entries are keyed by session ID only; revocations are rare, so drop them all
+        self._cache.invalidate()
+
+    def purge_expired(self):
+        return self.backend.purge_expired()
+
+    def stats(self):
+        return self._cache.stats()
+
+session_store = CachedSessionStore(SQLiteSessionStore())
+
+# ---------------------- Flask Session Interface ----------------------
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, session_id=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.session_id = session_id
+        self.new = new
+        self.expires = expires
+        self.opened_user_id = self.get("UserID")
+        self.modified = False
+        self.accessed = False
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Keeps session data in a SessionStore; the cookie only carries an opaque
+    random session ID. Data is written back only when the session changed.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        session_id = request.cookies.get(self.get_cookie_name(app))
+        if session_id:
+            record = self.store.get(session_id)
+            if record is not None:
+                return ServerSession(serializer.loads(record[0]), session_id, expires=record[1])
+        return ServerSession(session_id=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # An emptied session (logout) is removed from the store and the browser
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self.store.delete(session.session_id)
+                response.delete_cookie(
+                    self.get_cookie_name(app),
+                    domain=self.get_cookie_domain(app),
+                    path=self.get_cookie_path(app),
+                    secure=self.get_cookie_secure(app),
+                    samesite=self.get_cookie_samesite(app),
+                    httponly=self.get_cookie_httponly(app),
+                )
+            return
+
+        now = time.time()
+        if not session.modified:
+            # Keep an active session alive; writing only past the halfway
+            # point keeps read-only requests from writing every time
+            if not session.new and session.expires - now < SESSION_LIFETIME / 2:
+                session.expires = now + SESSION_LIFETIME
+                self.store.touch(session.session_id, session.expires)
+                self._set_cookie(app, session, response)
+            return
+
+        # Issue a new ID whenever the logged-in user changes, so an ID known
+        # before login is useless afterwards (session fixation)
+        if not session.new and session.get("UserID") != session.opened_user_id:
+            self.store.delete(session.session_id)
+            session.session_id = secrets.token_urlsafe(32)
+        session.expires = now + SESSION_LIFETIME
+        self.store.set(session.session_id, serializer.dumps(dict(session)), session.get("UserID"), session.expires)
+        self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        response.set_cookie(
+            self.get_cookie_name(app),
+            session.session_id,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
@@ -1,53 +1,52 @@
-import sqlite3
 import hashlib
-from datetime import datetime
-
-# Database configuration
-db_path = 'car_rental.db'
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from database import get_connection, db_path
+from availability import availability_index
+from cache import reference_cache, vehicle_cache
+from facets import facet_index, FACETS
+from sessions import session_store
 
 # ---------------------- User Management ----------------------
 
 def get_user(email):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM Users WHERE email=?", (email,))
     data = cursor.fetchone()
-    conn.close()
     return data
 
 def get_all_users():
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT UserID, Name FROM Users")
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def create_user(name, address, phone, email, age, gender, password, userType=0):
     password = hashlib.sha3_512(password.encode()).hexdigest()
     username = email.split("@")[0]
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "INSERT INTO Users (UserID, Name, Address, Phone, Email, Age, Gender, InsuranceCompany, UserPhoto, Username, Password, DLPhotos, Usertype) VALUES (NULL, ?, ?, ?, ?, ?, ?, NULL, NULL, ?, ?, NULL, ?)",
         (name, address, phone, email, age, gender, username, password, userType),
     )
     conn.commit()
-    conn.close()
 
 def update_customer_in_db(user_id, name, address, phone, email, age, gender, insurance_company, photo_filename):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE Users SET Name = ?, Address = ?, Phone = ?, Email = ?, Age = ?, Gender = ?, InsuranceCompany = ?, UserPhoto = ? WHERE UserID = ?",
         (name, address, phone, email, age, gender, insurance_company, photo_filename, user_id),
     )
     conn.commit()
-    conn.close()
 
 def insert_customer(customer_data, username, password):
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute(
             '''
@@ -61,40 +60,91 @@ def insert_customer(customer_data, username, password):
             )
         )
         conn.commit()
-        conn.close()
     except Exception as e:
         print(f"Error inserting customer: {e}")
         raise
 
 def mark_customer_inactive(user_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE Users SET Active = ? WHERE UserID = ?", ("False", user_id))
     conn.commit()
-    conn.close()
+    # Log the user out everywhere
+    session_store.delete_user(user_id)
 
 # ---------------------- Vehicle Management ----------------------
 
 def get_vehicle_information():
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM Vehicles WHERE Active = 'True'")
     data = cursor.fetchall()
-    conn.close()
     return data
 
 def get_vehicle_by_id(vehicle_id):
-    conn = sqlite3.connect(db_path)
+    """
+    Returns the Vehicles row for vehicle_id, served from vehicle_cache while
+    the catalog version is unchanged.
+    """
+    try:
+        vehicle_id = int(vehicle_id)
+    except (TypeError, ValueError):
+        return None
+    version = get_catalog_version()
+    vehicle = vehicle_cache.get(vehicle_id, version)
+    if vehicle is not None:
+        return vehicle
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM Vehicles WHERE VehicleID = ?", (vehicle_id,))
     vehicle = cursor.fetchone()
-    conn.close()
+    if vehicle:
+        vehicle_cache.put(vehicle_id, vehicle, version)
     return vehicle
 
+def get_catalog_version():
+    """
+    Returns the counter bumped by triggers whenever any vehicle is inserted,
+    updated or deleted.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT Version FROM CatalogVersion WHERE ID = 1")
+    data = cursor.fetchone()
+    return data[0] if data else None
+
+def get_vehicles_by_ids(vehicle_ids):
+    """
+    Returns {VehicleID: row} for the given IDs. Cached rows are reused while
+    the catalog version is unchanged and the rest are read in a single
+    query. Unknown IDs are left out.
+    """
+    version = get_catalog_version()
+    vehicles = {}
+    missing = []
+    for vehicle_id in vehicle_ids:
+        vehicle_id = int(vehicle_id)
+        if vehicle_id in vehicles or vehicle_id in missing:
+            continue
+        vehicle = vehicle_cache.get(vehicle_id, version)
+        if vehicle is not None:
+            vehicles[vehicle_id] = vehicle
+        else:
+            missing.append(vehicle_id)
+    if missing:
+        conn = get_connection()
+        cursor = conn.cursor()
+        placeholders = ", ".join("?" for _ in missing)
+        cursor.execute(f"SELECT * FROM Vehicles WHERE VehicleID IN ({placeholders})", missing)
+        for vehicle in cursor.fetchall():
+            vehicle_cache.put(vehicle[0], vehicle, version)
+            vehicles[vehicle[0]] = vehicle
+    return vehicles
+
 def insert_vehicle(vehicle_data):
     try:
         serviceid = determine_service_id(vehicle_data['mileage'])
-        conn = sqlite3.connect(db_path)
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute(
             '''
@@ -111,13 +161,13 @@ def insert_vehicle(vehicle_data):
             )
         )
         conn.commit()
-        conn.close()
+        facet_index.refresh_vehicle(cursor.lastrowid)
     except Exception as e:
         print(f"Error adding vehicle: {e}")
         raise
 
 def update_vehicle_in_db(vehicle_id, make, model, year, type, mileage, transmission, numdoors, repairstatus, available, photos, locationid, serviceid, keyfeatures, description, drivetrain):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         '''
@@ -128,63 +178,132 @@ def update_vehicle_in_db(vehicle_id, make, model, year, type, mileage, transmiss
         (make, model, year, type, mileage, transmission, numdoors, repairstatus, available, photos, locationid, serviceid, keyfeatures, description, drivetrain, vehicle_id)
     )
     conn.commit()
-    conn.close()
+    vehicle_cache.invalidate(int(vehicle_id))
+    facet_index.refresh_vehicle(vehicle_id)
 
 def mark_vehicle_inactive(vehicle_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE Vehicles SET Active = ? WHERE VehicleID = ?", ("False", vehicle_id))
     conn.commit()
-    conn.close()
+    vehicle_cache.invalidate(int(vehicle_id))
 
 # ---------------------- Reservation Management ----------------------
 
+class ReservationConflict(Exception):
+    """Raised when a vehicle is already reserved for part of the requested dates."""
+
+def check_vehicle_free(cursor, vehicleid, startdate, enddate):
+    """
+    Raises ReservationConflict if an existing reservation overlaps the dates.
+    Call inside a BEGIN IMMEDIATE transaction so no other writer can book
+    the vehicle between this check and the insert.
+    """
+    cursor.execute(
+        "SELECT ReservationID FROM Reservations WHERE VehicleID = ? AND StartDay <= ? AND EndDay >= ? LIMIT 1",
+        (vehicleid, to_day_number(enddate), to_day_number(startdate))
+    )
+    conflict = cursor.fetchone()
+    if conflict:
+        raise ReservationConflict(f"Vehicle {vehicleid} is already reserved between {startdate.strip()} and {enddate.strip()} (reservation {conflict[0]}).")
+
 def make_reservation_db(vehicleid, planid, customerid, startdate, enddate, numdays, picklocation, droplocation, userID, totalprice):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        '''
-        INSERT INTO Reservations (VehicleID, UserID, PlanID, ReserveStartDate, ReserveEndDate, NumDays, 
-        PickUpLocation, DropOffLocation, CustomerID, TotalPrice) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''',
-        (vehicleid, userID, planid, startdate, enddate, numdays, picklocation, droplocation, customerid, totalprice)
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        version_before = get_reservations_version()
+        check_vehicle_free(cursor, vehicleid, startdate, enddate)
+        cursor.execute(
+            '''
+            INSERT INTO Reservations (VehicleID, UserID, PlanID, ReserveStartDate, ReserveEndDate, NumDays, 
+            PickUpLocation, DropOffLocation, CustomerID, TotalPrice) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            (vehicleid, userID, planid, startdate, enddate, numdays, picklocation, droplocation, customerid, totalprice)
+        )
+        reservationid = cursor.lastrowid
+        version_after = get_reservations_version()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    availability_index.add_written(
+        [(vehicleid, to_day_number(startdate), to_day_number(enddate), reservationid)], version_before, version_after
     )
-    conn.commit()
-    conn.close()
     return True
 
+def checkout_db(name, address, phone, email, dlphoto, cart_items, droplocation, userID):
+    """
+    Records a whole cart in one transaction: the customer row, then for each
+    (vehicleid, planid, startdate, enddate, numdays, picklocation, totalprice)
+    item a reservation and its invoice. Nothing is written if any insert fails
+    or any vehicle is already booked (ReservationConflict).
+    Returns the new ReservationIDs.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    reservation_ids = []
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        version_before = get_reservations_version()
+        cursor.execute("INSERT INTO Customers (Name, Address, Phone, Email, DLPhoto) VALUES (?, ?, ?, ?, ?)", (name, address, phone, email, dlphoto))
+        # Reservations stay attached to the first customer record for this email, as get_customer_tableData expects
+        cursor.execute("SELECT CustomerID FROM Customers WHERE Email = ?", (email,))
+        customerid = cursor.fetchone()[0]
+        for vehicleid, planid, startdate, enddate, numdays, picklocation, totalprice in cart_items:
+            check_vehicle_free(cursor, vehicleid, startdate, enddate)
+            cursor.execute(
+                '''
+                INSERT INTO Reservations (VehicleID, UserID, PlanID, ReserveStartDate, ReserveEndDate, NumDays, 
+                PickUpLocation, DropOffLocation, CustomerID, TotalPrice) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                (vehicleid, userID, planid, startdate, enddate, numdays, picklocation, droplocation, customerid, totalprice)
+            )
+            reservationid = cursor.lastrowid
+            cursor.execute(
+                "INSERT INTO Invoice (PlanID, ReservationID, VehicleID, CustomerID) VALUES (?, ?, ?, ?)",
+                (planid, reservationid, vehicleid, customerid)
+            )
+            cursor.execute("UPDATE Reservations SET InvoiceID = ? WHERE ReservationID = ?", (cursor.lastrowid, reservationid))
+            reservation_ids.append(reservationid)
+        version_after = get_reservations_version()
+        conn.commit()
+    except ReservationConflict:
+        conn.rollback()
+        raise
+    except Exception as e:
+        conn.rollback()
+        print(f"Error during checkout: {e}")
+        raise
+
+    availability_index.add_written(
+        [
+            (vehicleid, to_day_number(startdate), to_day_number(enddate), reservationid)
+            for (vehicleid, planid, startdate, enddate, numdays, picklocation, totalprice), reservationid in zip(cart_items, reservation_ids)
+        ],
+        version_before,
+        version_after
+    )
+    return reservation_ids
+
 def get_reservation_by_id(reservationid):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM Reservations WHERE ReservationID = ?", (reservationid,))
     data = cursor.fetchone()
-    conn.close()
     return data
 
 def update_reservation_SA(ReservationID, fileloc):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE Reservations SET ContractLocation = ?, SignedContract = 'True' WHERE ReservationID = ?", (fileloc, ReservationID))
     conn.commit()
-    conn.close()
-    return True
-
-def drop_off_car(reservation_id):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT VehicleID FROM Reservations WHERE ReservationID = ?", (reservation_id,))
-    vehicle_id = cursor.fetchone()[0]
-    cursor.execute("UPDATE Vehicles SET Available = ? WHERE VehicleID = ?", ("Yes", vehicle_id))
-    cursor.execute("UPDATE Vehicles SET LocationID = (SELECT DropOffLocation FROM Reservations WHERE ReservationID = ?) WHERE VehicleID = ?", (reservation_id, vehicle_id))
-    cursor.execute("UPDATE Reservations SET DroppedOff = 'True' WHERE ReservationID = ?", (reservation_id,))
-    conn.commit()
-    conn.close()
     return True
 
 # ---------------------- Invoice Management ----------------------
 
 def make_invoice_db(planID, ReservationID, VehicleID, CustomerID):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         '''
@@ -194,80 +313,125 @@ def make_invoice_db(planID, ReservationID, VehicleID, CustomerID):
         (planID, ReservationID, VehicleID, CustomerID)
     )
     conn.commit()
-    conn.close()
     return True
 
 def get_invoiceid_by_reservationid(reservationid):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT InvoiceID FROM Invoice WHERE ReservationID = ?", (reservationid,))
     data = cursor.fetchone()
-    conn.close()
     return data[0] if data else None
 
 # ---------------------- Vehicle Filtering and Availability ----------------------
 
-def filter_vehicles(type, make, model, drive, transmission, location):
-    type = "%" if type == "" else type
-    make = "%" if make == "" else make
-    model = "%" if model == "" else model
-    drive = "%" if drive == "" else drive
-    transmission = "%" if transmission == "" else transmission
-    location = "%" if location == "" else location
+def to_fts_query(text):
+    """
+    Turns free text from the search box into an FTS5 query: every word
+    becomes a quoted prefix term and all of them must match. Returns ""
+    when there is nothing to search for.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text or ""))
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        '''
-        SELECT * FROM Vehicles 
-        WHERE Type LIKE ? AND Make LIKE ? AND Model LIKE ? 
-        AND DriveTrain LIKE ? AND Transmission LIKE ? AND LocationID LIKE ?
-        ''',
-        (type, make, model, drive, transmission, location)
+@lru_cache(maxsize=256)
+def vehicle_filter_sql(shape, available_between=False, search=False):
+    """
+    Returns the SELECT for a filter shape: a tuple of (filter field, number
+    of values) pairs. Only supplied filters become predicates, each an
+    equality or IN on the Vehicles column (text columns compare
+    case-insensitively, like the dropdown values). With `search` the rows
+    come from a VehicleSearch MATCH, best BM25 rank first. The text is
+    cached per shape so sqlite3's statement cache can reuse the prepared
+    statement.
+    """
+    predicates = ["VehicleSearch MATCH ?"] if search else []
+    for field, count in shape:
+        column = f"V.{FACETS[field]}" if field == "location" else f"V.{FACETS[field]} COLLATE NOCASE"
+        if count == 1:
+            predicates.append(f"{column} = ?")
+        else:
+            predicates.append(f"{column} IN ({', '.join('?' * count)})")
+    if available_between:
+        predicates.append(
+            """NOT EXISTS (
+                SELECT 1
+                FROM Reservations R
+                WHERE R.VehicleID = V.VehicleID
+                  AND R.StartDay <= ?
+                  AND R.EndDay >= ?
+            )"""
+        )
+    where = f" WHERE {' AND '.join(predicates)}" if predicates else ""
+    if search:
+        return (
+            "SELECT V.* FROM VehicleSearch JOIN Vehicles V ON V.VehicleID = VehicleSearch.rowid"
+            f"{where} ORDER BY bm25(VehicleSearch), V.VehicleID"
+        )
+    return f"SELECT V.* FROM Vehicles V{where} ORDER BY V.VehicleID"
+
+def build_vehicle_filter(filters, start_date=None, end_date=None, search=""):
+    """
+    Builds (sql, params) for {filter field: value or list of values}.
+    Empty values are skipped. With start_date/end_date only vehicles with
+    no overlapping reservation are returned; with search text the results
+    are limited to full-text matches and ranked by relevance.
+    """
+    shape = []
+    match = to_fts_query(search)
+    params = [match] if match else []
+    for field in FACETS:
+        values = filters.get(field)
+        if values is None:
+            continue
+        if isinstance(values, (str, int)):
+            values = [values]
+        values = list(dict.fromkeys(str(value).strip() for value in values if str(value).strip()))
+        if not values:
+            continue
+        shape.append((field, len(values)))
+        params += values
+    available_between = start_date is not None and end_date is not None
+    if available_between:
+        params += [to_day_number(end_date), to_day_number(start_date)]
+    return vehicle_filter_sql(tuple(shape), available_between, bool(match)), params
+
+def filter_vehicles(type, make, model, drive, transmission, location, search=""):
+    """
+    Returns the vehicles matching the filters. Each argument is a value or
+    a list of values; empty ones are ignored. Search text ranks the results
+    by relevance.
+    """
+    query, params = build_vehicle_filter(
+        {"type": type, "make": make, "model": model, "drive": drive, "transmission": transmission, "location": location},
+        search=search
     )
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
     data = cursor.fetchall()
-    conn.close()
     return data
 
-def filter_vehicles_by_dates(type, make, model, drive, transmission, location, start_date, end_date):
-    type = "%" if type == "" else type
-    make = "%" if make == "" else make
-    model = "%" if model == "" else model
-    drive = "%" if drive == "" else drive
-    transmission = "%" if transmission == "" else transmission
-    location = "%" if location == "" else location
-
-    formatted_start_date = f"{start_date[6:]}-{start_date[:2]}-{start_date[3:5]}"
-    formatted_end_date = f"{end_date[6:]}-{end_date[:2]}-{end_date[3:5]}"
-
-    query = """
-    SELECT V.*
-    FROM Vehicles V
-    WHERE V.Type LIKE ?
-      AND V.Make LIKE ?
-      AND V.Model LIKE ?
-      AND V.DriveTrain LIKE ?
-      AND V.Transmission LIKE ?
-      AND V.LocationID LIKE ?
-      AND NOT EXISTS (
-        SELECT 1
-        FROM Reservations R
-        WHERE R.VehicleID = V.VehicleID
-          AND (
-            DATE(substr(R.ReserveStartDate, 7, 4) || '-' || substr(R.ReserveStartDate, 1, 2) || '-' || substr(R.ReserveStartDate, 4, 2)) <= DATE(?)
-            AND DATE(substr(R.ReserveEndDate, 7, 4) || '-' || substr(R.ReserveEndDate, 1, 2) || '-' || substr(R.ReserveEndDate, 4, 2)) >= DATE(?)
-          )
-      )
-    """
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        query,
-        (type, make, model, drive, transmission, location, formatted_end_date, formatted_start_date)
+def filter_vehicles_by_dates(type, make, model, drive, transmission, location, start_date, end_date, search=""):
+    # Answer from the in-memory interval index when it has seen every
+    # reservation write, including other processes', and the range is within
+    # its per-day buckets; past or very long ranges use the indexed SQL query
+    free_vehicles = availability_index.filter_free(
+        filter_vehicles(type, make, model, drive, transmission, location, search),
+        to_day_number(start_date),
+        to_day_number(end_date)
+    ) if availability_index.is_current(get_reservations_version()) else None
+    if free_vehicles is not None:
+        return free_vehicles
+
+    query, params = build_vehicle_filter(
+        {"type": type, "make": make, "model": model, "drive": drive, "transmission": transmission, "location": location},
+        start_date,
+        end_date,
+        search
     )
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
     data = cursor.fetchall()
-    conn.close()
     return data
 
 # ---------------------- Payment and Invoice Updates ----------------------
@@ -278,7 +442,7 @@ def updateinvoice(reservationid, payment):
     invoiceID = get_invoiceid_by_reservationid(reservationid)
     currentdate = datetime.now().strftime("%m/%d/%Y")
 
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE Invoice SET PaidAmount = ?, LastPaymentDate = ? WHERE InvoiceID = ?",
@@ -292,171 +456,289 @@ def updateinvoice(reservationid, payment):
     elif payment < total_price:
         cursor.execute("UPDATE Invoice SET PaymentStatus = 'Partial' WHERE InvoiceID = ?", (invoiceID,))
     conn.commit()
-    conn.close()
 
 def updatemileage(reservationid, mileage):
     vehicleid = get_reservation_by_id(reservationid)[1]
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE Vehicles SET Mileage = ? WHERE VehicleID = ?", (mileage, vehicleid))
     conn.commit()
-    conn.close()
+    vehicle_cache.invalidate(vehicleid)
 
 # ---------------------- Utility Functions ----------------------
 
+def to_day_number(date_str):
+    """
+    Converts a MM/DD/YYYY or YYYY-MM-DD date into the julian day number
+    stored in Reservations.StartDay / Reservations.EndDay.
+    """
+    date_str = date_str.strip()
+    date_format = "%Y-%m-%d" if "-" in date_str else "%m/%d/%Y"
+    return datetime.strptime(date_str, date_format).toordinal() + 1721424
+
+def from_day_number(day):
+    """
+    Converts a julian day number back into a YYYY-MM-DD string.
+    """
+    return date.fromordinal(day - 1721424).strftime("%Y-%m-%d")
+
 def determine_service_id(mileage):
+    """
+    Returns the ServiceID of the first service interval whose mileage
+    checkpoint has not been passed yet.
+    """
     mileage = int(mileage)
-    if mileage <= 5000:
-        return 1
-    elif mileage <= 10000:
-        return 2
-    elif mileage <= 15000:
-        return 3
-    elif mileage <= 25000:
-        return 4
-    elif mileage <= 50000:
-        return 5
-    else:
-        return 9
+    intervals = reference_cache.get("ServiceIntervals")
+    for interval in intervals:
+        if mileage <= interval[3]:
+            return interval[0]
+    return intervals[-1][0]
+
+# ---------------------- Rollup Reports ----------------------
+
+# get_rollup() groupings -> column. Locations are where reservations were
+# picked up, not the vehicle's current location (drop-offs change that).
+ROLLUP_GROUPS = {"vehicle": "d.VehicleID", "type": "v.Type", "location": "d.LocationID"}
+
+def get_range_revenue(start_day, end_day):
+    """
+    Total price of every reservation overlapping [start_day, end_day], read
+    from DailyRollup in O(days): reservations starting by end_day minus
+    those that already ended before start_day.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT (SELECT COALESCE(SUM(Revenue), 0) FROM DailyRollup WHERE Day <= ?)
+             - (SELECT COALESCE(SUM(EndedRevenue), 0) FROM DailyRollup WHERE Day <= ?)
+        """,
+        (end_day, start_day)
+    )
+    return max(0.0, round(cursor.fetchone()[0], 2))
+
+def get_rollup(start_date, end_date, group_by="vehicle"):
+    """
+    Per vehicle, type or pick-up location: the reservations starting between
+    start_date and end_date (inclusive) with their revenue and payments, and
+    the number of days within the range its vehicles were rented out.
+    Rows: (group, reservations, revenue, rented days, paid).
+    """
+    if group_by not in ROLLUP_GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(ROLLUP_GROUPS)}")
+    column = ROLLUP_GROUPS[group_by]
+    start_day = to_day_number(start_date)
+    end_day = to_day_number(end_date)
+    conn = get_connection()
+    cursor = conn.cursor()
+    # A RentalChange on day D counts once for every day from max(D, start_day) to end_day
+    cursor.execute(
+        f"""
+        SELECT {column},
+               SUM(CASE WHEN d.Day >= :start THEN d.Reservations ELSE 0 END) AS Started,
+               SUM(CASE WHEN d.Day >= :start THEN d.Revenue ELSE 0 END),
+               SUM(d.RentalChange * (:end - MAX(d.Day, :start) + 1)) AS RentedDays,
+               SUM(CASE WHEN d.Day >= :start THEN d.PaidAmount ELSE 0 END)
+        FROM VehicleDailyRollup d
+        LEFT JOIN Vehicles v ON v.VehicleID = d.VehicleID
+        WHERE d.Day <= :end
+        GROUP BY {column}
+        HAVING Started > 0 OR RentedDays > 0
+        ORDER BY {column}
+        """,
+        {"start": start_day, "end": end_day}
+    )
+    return cursor.fetchall()
 
 # ---------------------- Reservation and Customer Data Retrieval ----------------------
 
+def get_reservations_version():
+    """
+    Returns the counter bumped by triggers whenever a reservation is added,
+    removed or has its vehicle or dates changed.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT ReservationsVersion FROM CatalogVersion WHERE ID = 1")
+    data = cursor.fetchone()
+    return data[0] if data else None
+
 def get_reserved_dates(vehicle_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT ReserveStartDate, ReserveEndDate FROM Reservations WHERE VehicleID = ?", (vehicle_id,))
     dates = cursor.fetchall()
-    conn.close()
     return dates
 
-def get_reservations_tableData(numRows=5, pickedup=False):
-    conn = sqlite3.connect(db_path)
+def get_reserved_days(vehicle_id, from_day):
+    """
+    Returns (StartDay, EndDay) for the vehicle's reservations that end on or
+    after from_day, ordered by start (an idx_Reservations_VehicleDays seek).
+    """
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        '''
-        SELECT ReservationID, VehicleID, ReserveStartDate, ReserveEndDate, InvoiceID, CustomerID, DroppedOff
-        FROM Reservations
-        WHERE PickedUp = ? AND DroppedOff = 'False'
-        ORDER BY ReservationID DESC
+        "SELECT StartDay, EndDay FROM Reservations WHERE VehicleID = ? AND EndDay >= ? ORDER BY StartDay",
+        (vehicle_id, from_day)
+    )
+    return cursor.fetchall()
+
+# Everything the pickup/drop-off tables and modals show, in one round trip.
+# Columns: 0 ReservationID, 1 VehicleID, 2 ReserveStartDate, 3 ReserveEndDate,
+# 4 InvoiceID, 5 CustomerID, 6 DroppedOff, 7 Email, 8 Make, 9 Model, 10 Year,
+# 11 Type, 12 Mileage, 13 Transmission, 14 DriveTrain, 15 PickUp address,
+# 16 DropOff address, 17 TotalPrice, 18 SignedContract, 19 PaymentStatus, 20 PaidAmount,
+# 21 PickedUp
+RESERVATION_DETAILS_QUERY = '''
+    SELECT r.ReservationID, r.VehicleID, r.ReserveStartDate, r.ReserveEndDate, r.InvoiceID, r.CustomerID, r.DroppedOff,
+           c.Email, v.Make, v.Model, v.Year, v.Type, v.Mileage, v.Transmission, v.DriveTrain,
+           pl.Address, dl.Address, r.TotalPrice, r.SignedContract, i.PaymentStatus, i.PaidAmount, r.PickedUp
+    FROM Reservations r
+    JOIN Vehicles v ON v.VehicleID = r.VehicleID
+    LEFT JOIN Customers c ON c.CustomerID = r.CustomerID
+    LEFT JOIN Locations pl ON pl.LocationID = r.PickUpLocation
+    LEFT JOIN Locations dl ON dl.LocationID = r.DropOffLocation
+    LEFT JOIN Invoice i ON i.InvoiceID = (SELECT MIN(InvoiceID) FROM Invoice WHERE ReservationID = r.ReservationID)
+'''
+
+def get_reservation_details(reservation_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(RESERVATION_DETAILS_QUERY + "WHERE r.ReservationID = ?", (reservation_id,))
+    data = cursor.fetchone()
+    return data
+
+# Keyset cursor for the first page: larger than any ReservationID
+FIRST_PAGE = 9223372036854775807
+
+def get_reservations_tableData(numRows=5, pickedup=False, before=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        RESERVATION_DETAILS_QUERY + '''
+        WHERE r.PickedUp = ? AND r.DroppedOff = 'False' AND r.ReservationID < ?
+        ORDER BY r.ReservationID DESC
         LIMIT ?
         ''',
-        (str(pickedup), numRows)
+        (str(pickedup), before or FIRST_PAGE, numRows)
     )
     data = cursor.fetchall()
-    conn.close()
     return data
 
-def get_customer_tableData(userEmail, pickedUp=False):
-    conn = sqlite3.connect(db_path)
+def get_customer_tableData(userEmail, pickedUp=False, numRows=-1, before=None):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        '''
-        SELECT ReservationID, VehicleID, ReserveStartDate, ReserveEndDate, InvoiceID, CustomerID, DroppedOff
-        FROM Reservations
-        WHERE CustomerID = (SELECT CustomerID FROM Customers WHERE Email = ?)
-        AND PickedUp = ?
+        RESERVATION_DETAILS_QUERY + '''
+        WHERE r.CustomerID = (SELECT CustomerID FROM Customers WHERE Email = ?)
+        AND r.PickedUp = ? AND r.ReservationID < ?
+        ORDER BY r.ReservationID DESC
+        LIMIT ?
         ''',
-        (userEmail, str(pickedUp))
+        (userEmail, str(pickedUp), before or FIRST_PAGE, numRows)
     )
     data = cursor.fetchall()
-    conn.close()
     return data
 
+# ---------------------- Reference Table Cache ----------------------
+
+# Locations, RentalPlans and ServiceIntervals are read whole through
+# reference_cache (cache.py). Anything that writes to one of these tables
+# must call reference_cache.invalidate("<Table>") afterwards.
+
+def load_locations():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM Locations ORDER BY LocationID")
+    return {location[0]: location for location in cursor.fetchall()}
+
+def load_rental_plans():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM RentalPlans ORDER BY PlanID")
+    plans = {}
+    for plan in cursor.fetchall():
+        plans.setdefault(plan[2], []).append(plan)
+    return plans
+
+def load_service_intervals():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM ServiceIntervals ORDER BY MileageCheckpoint")
+    return cursor.fetchall()
+
+reference_cache.register("Locations", load_locations)
+reference_cache.register("RentalPlans", load_rental_plans)
+reference_cache.register("ServiceIntervals", load_service_intervals)
+
 # ---------------------- Location and Customer Utilities ----------------------
 
 def get_location_options():
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT LocationID, Address FROM Locations")
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    return [(location[0], location[1]) for location in reference_cache.get("Locations").values()]
 
 def get_location_by_id(location_id):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Locations WHERE LocationID = ?", (location_id,))
-    location = cursor.fetchone()
-    conn.close()
-    return location
+    try:
+        return reference_cache.get("Locations").get(int(location_id))
+    except (TypeError, ValueError):
+        return None
 
 def get_emailData_by_customerid(customer_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT Email FROM Customers WHERE CustomerID = ?", (customer_id,))
     data = cursor.fetchone()
-    conn.close()
     return data[0] if data else None
 
 def get_customerid_by_email(email):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT CustomerID FROM Customers WHERE Email = ?", (email,))
     data = cursor.fetchone()
-    conn.close()
     return data
 
 def insert_customer_CustomerTable(name, address, phone, email, filename):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("INSERT INTO Customers (Name, Address, Phone, Email, DLPhoto) VALUES (?, ?, ?, ?, ?)", (name, address, phone, email, filename))
     conn.commit()
-    conn.close()
 
 # ---------------------- Payment and Pricing Utilities ----------------------
 
 def get_reservation_totalprice(reservationid):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT TotalPrice FROM Reservations WHERE ReservationID = ?", (reservationid,))
     data = cursor.fetchone()
-    conn.close()
     return data[0] if data else None
 
 def get_invoice_PaidAmount(reservationid):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT PaidAmount FROM Invoice WHERE ReservationID = ?", (reservationid,))
     data = cursor.fetchone()
-    conn.close()
     return data[0] if data else None
 
 def get_payment_status(reservation_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT PaymentStatus FROM Invoice WHERE ReservationID = ?", (reservation_id,))
     data = cursor.fetchone()
-    conn.close()
     return data[0] if data else None
 
 def get_rates_by_vehicle_type(vehicle_type):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM RentalPlans WHERE Type = ?", (vehicle_type,))
-    rates = cursor.fetchall()
-    conn.close()
-    return rates
+    return list(reference_cache.get("RentalPlans").get(vehicle_type, []))
 
 # ---------------------- Reservation and Vehicle Updates ----------------------
 
 def update_reservation_db(ReservationID, InvoiceID):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE Reservations SET InvoiceID = ? WHERE ReservationID = ?", (InvoiceID, ReservationID))
     conn.commit()
-    conn.close()
-    return True
-
-def update_reservation_SA(ReservationID, fileloc):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE Reservations SET ContractLocation = ?, SignedContract = 'True' WHERE ReservationID = ?", (fileloc, ReservationID))
-    conn.commit()
-    conn.close()
     return True
 
 def pick_up_car(reservation_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -478,13 +760,13 @@ def pick_up_car(reservation_id):
             cursor.execute("UPDATE Vehicles SET Available = ? WHERE VehicleID = ?", ("No", vehicle_id))
             cursor.execute("UPDATE Reservations SET PickedUp = 'True' WHERE ReservationID = ?", (reservation_id,))
             conn.commit()
+            vehicle_cache.invalidate(vehicle_id)
     except Exception as e:
         print(f"Error in pick_up_car: {e}")
-    finally:
-        conn.close()
+        conn.rollback()
 
 def drop_off_car(reservation_id):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT VehicleID FROM Reservations WHERE ReservationID = ?", (reservation_id,))
     vehicle_id = cursor.fetchone()[0]
@@ -492,27 +774,20 @@ def drop_off_car(reservation_id):
     cursor.execute("UPDATE Vehicles SET LocationID = (SELECT DropOffLocation FROM Reservations WHERE ReservationID = ?) WHERE VehicleID = ?", (reservation_id, vehicle_id))
     cursor.execute("UPDATE Reservations SET DroppedOff = 'True' WHERE ReservationID = ?", (reservation_id,))
     conn.commit()
-    conn.close()
+    vehicle_cache.invalidate(vehicle_id)
+    facet_index.refresh_vehicle(vehicle_id)
+    availability_index.reload_vehicle(vehicle_id)
     return True
 
 def get_planid_by_vehicleid(vehicleid):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(
-        '''
-        SELECT rp.PlanID 
-        FROM RentalPlans rp
-        JOIN Vehicles v ON rp.Type = v.Type
-        WHERE v.VehicleID = ?
-        ''',
-        (vehicleid,)
-    )
-    data = cursor.fetchone()
-    conn.close()
-    return data[0] if data else None
+    vehicle = get_vehicle_by_id(vehicleid)
+    if not vehicle:
+        return None
+    rates = get_rates_by_vehicle_type(vehicle[4])
+    return rates[0][0] if rates else None
 
 def get_reservationid_by_customerid(customerid, vehicleid, startdate, enddate):
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         '''
@@ -523,5 +798,4 @@ def get_reservationid_by_customerid(customerid, vehicleid, startdate, enddate):
         (customerid, vehicleid, startdate, enddate)
     )
     data = cursor.fetchone()
-    conn.close()
     return data[0] if data else None
\ No newline at end of file
@@ -1,22 +1,36 @@
 # ---------------------- Imports and Constants ----------------------
 import hashlib
+import secrets
 from datetime import datetime, timedelta
 from flask import session
 from markupsafe import Markup
 from sqlQueries import *
+from facets import facet_index
+from cache import fragment_cache, calendar_cache
+from availability import today_day_number
 
-MAKES = {"": "Make"}
-MODELS = {"": "Model"}
+# Placeholder shown first in each filter dropdown
+FACET_PLACEHOLDERS = {
+    "type": "Type",
+    "make": "Make",
+    "model": "Model",
+    "drive": "Drive Train",
+    "transmission": "Transmission",
+    "location": "Location",
+}
+
+# Display names for drive train values
+DRIVE_LABELS = {"4WD": "4x4", "FWD": "2x4"}
 
 # ---------------------- HTML Generators ----------------------
 
 def generate_vehicle_html(vehicle_data):
     """
-    Generates HTML for vehicle listings.
+    Generates HTML for vehicle listings. Each card is cached by
+    (VehicleID, RowVersion), so only changed vehicles are re-rendered.
     """
-    vehicle_html = ""
     if vehicle_data == []:
-        vehicle_html = Markup(
+        return Markup(
             """
             <style>
             h1 {text-align: center; margin-top: 100px; margin-left: auto; margin-right: auto; width: 100%; font-size: 50px;}
@@ -24,11 +38,15 @@ def generate_vehicle_html(vehicle_data):
             <h1>No Results Found!</h1>
             """
         )
+    cards = []
     for vehicle in vehicle_data:
         if vehicle[9] == "no":
             continue
-        vehicle_html += Markup(
-            """<div class="col">
+        key = (vehicle[0], vehicle[17])
+        card = fragment_cache.get(key)
+        if card is None:
+            card = Markup(
+                """<div class="col">
                  <div><a href="/vehicle/{VehicleID}">
                      <img class="rounded img-fluid d-block w-100 fit-cover" style="height: 400px;width: 400px !important;" src="{photo}"></a>
                      <div class="py-4">
@@ -36,91 +54,91 @@ def generate_vehicle_html(vehicle_data):
                      </div>
                  </div>
                </div>"""
-        ).format(VehicleID=vehicle[0], photo=vehicle[10].split("ㄹ")[0], year=vehicle[3], make=vehicle[1], model=vehicle[2])
-        if vehicle[1] not in MAKES:
-            MAKES[vehicle[1]] = vehicle[1]
-        if vehicle[2] not in MODELS:
-            MODELS[vehicle[2]] = vehicle[2]
-    return vehicle_html
+            ).format(VehicleID=vehicle[0], photo=vehicle[10].split("ㄹ")[0], year=vehicle[3], make=vehicle[1], model=vehicle[2])
+            fragment_cache.put(key, card)
+        cards.append(card)
+    return Markup("").join(cards)
+
+def facet_label(facet, value):
+    """
+    Returns the dropdown label for a facet value.
+    """
+    if facet == "drive":
+        return DRIVE_LABELS.get(value, value)
+    if facet == "location":
+        location = get_location_by_id(value)
+        return location[1].split(",")[0] if location else value
+    return value
 
 def generate_options(selected_type, selected_make, selected_model, selected_drive, selected_transmission, selected_location, vehicle_data):
     """
     Generates HTML options with 'selected' attributes for filter fields.
+    Values come from the facet index; each label carries the number of
+    vehicles that match it together with the other selected filters.
     """
-    type_options = generate_select_options(
-        {"": "Type", "sedan": "Sedan", "suv": "SUV", "truck": "Truck", "coupe": "Coupe"},
-        selected_type
-    )
-    make_options = generate_select_options(MAKES, selected_make)
-    model_options = generate_select_options(MODELS, selected_model)
-    drive_options = generate_select_options(
-        {"": "Drive Train", "4WD": "4x4", "FWD": "2x4", "AWD": "AWD"},
-        selected_drive
-    )
-    transmission_options = generate_select_options(
-        {"": "Transmission", "manual": "Manual", "automatic": "Automatic"},
-        selected_transmission
-    )
-    location_options = generate_select_options(
-        {"": "Location", "10": "123 Maple St", "11": "456 Oak Ave", "12": "789 Pine Dr"},
-        selected_location
-    )
-    return {
-        'type_options': type_options,
-        'make_options': make_options,
-        'model_options': model_options,
-        'drive_options': drive_options,
-        'transmission_options': transmission_options,
-        'location_options': location_options,
+    selected = {
+        "type": selected_type,
+        "make": selected_make,
+        "model": selected_model,
+        "drive": selected_drive,
+        "transmission": selected_transmission,
+        "location": selected_location,
     }
+    counts = facet_index.filtered_counts(selected)
+    options = {}
+    for facet, placeholder in FACET_PLACEHOLDERS.items():
+        choices = {"": placeholder}
+        for value, count in counts[facet]:
+            choices[value] = f"{facet_label(facet, value)} ({count})"
+        options[f"{facet}_options"] = generate_select_options(choices, selected[facet])
+    return options
 
-def generate_cart_html(reserved_cars):
+def generate_cart_html(cart_items):
     """
-    Generates the HTML content for the cart table.
+    Generates the HTML content for the cart table from CartItems.
     """
     cart_html = ""
-    for car in reserved_cars:
-        car_details = car.strip().split(",")
-        if len(car_details) == 3:
-            vehicle_id = car_details[0]
-            date_range = car_details[1]
-            reserve_id = car_details[2]
-            vehicle = get_vehicle_by_id(vehicle_id)
-            if vehicle:
-                cart_html += Markup(
-                    """<tr>
-                        <th scope="row" class="border-0">
-                            <div class="p-2">
-                                <img src="{Photo}" alt="" width="70" class="img-fluid rounded shadow-sm">
-                                <div class="ml-3 d-inline-block align-middle">
-                                    <h5 class="mb-0"> 
-                                        <a href="/vehicle/{VehicleID}" class="text-dark d-inline-block align-middle">
-                                            {year} {make} {model}
-                                        </a>
-                                    </h5>
-                                    <span class="text-muted font-weight-normal font-italic d-block">Type: {type}</span>
-                                </div>
+    vehicles = get_cart_vehicles(cart_items)
+    for item in cart_items:
+        vehicle_id = item.vehicle_id
+        date_range = item.daterange
+        reserve_id = item.item_id
+        vehicle = vehicles.get(vehicle_id)
+        if vehicle:
+            cart_html += Markup(
+                """<tr>
+                    <th scope="row" class="border-0">
+                        <div class="p-2">
+                            <img src="{Photo}" alt="" width="70" class="img-fluid rounded shadow-sm">
+                            <div class="ml-3 d-inline-block align-middle">
+                                <h5 class="mb-0"> 
+                                    <a href="/vehicle/{VehicleID}" class="text-dark d-inline-block align-middle">
+                                        {year} {make} {model}
+                                    </a>
+                                </h5>
+                                <span class="text-muted font-weight-normal font-italic d-block">Type: {type}</span>
                             </div>
-                        </th>
-                        <td class="border-0 align-middle"><strong>{dates}</strong></td>
-                        <td class="border-0 align-middle"><strong>{numDays}</strong></td>
-                        <td class="border-0 align-middle">
-                            <a href="/remove/{ReserveID}" class="text-dark">
-                                <i class="fa fa-trash"></i>
-                            </a>
-                        </td>
-                    </tr>"""
-                ).format(
-                    Photo=vehicle[10].split("ㄹ")[0],
-                    year=vehicle[3],
-                    make=vehicle[1],
-                    model=vehicle[2],
-                    type=vehicle[4],
-                    dates=date_range,
-                    VehicleID=vehicle_id,
-                    numDays=getNumDays(date_range) + 1,
-                    ReserveID=reserve_id
-                )
+                        </div>
+                    </th>
+                    <td class="border-0 align-middle"><strong>{dates}</strong></td>
+                    <td class="border-0 align-middle"><strong>{numDays}</strong></td>
+                    <td class="border-0 align-middle">
+                        <a href="/remove/{ReserveID}" class="text-dark">
+                            <i class="fa fa-trash"></i>
+                        </a>
+                    </td>
+                </tr>"""
+            ).format(
+                Photo=vehicle[10].split("ㄹ")[0],
+                year=vehicle[3],
+                make=vehicle[1],
+                model=vehicle[2],
+                type=vehicle[4],
+                dates=date_range,
+                VehicleID=vehicle_id,
+                numDays=item.num_days,
+                ReserveID=reserve_id
+            )
     return cart_html
 
 # ---------------------- Utilities ----------------------
@@ -150,6 +168,35 @@ def generate_dates_between(start_date, end_date):
         current_date += timedelta(days=1)
     return date_list
 
+def merge_day_ranges(ranges):
+    """
+    Merges (start, end) day-number ranges that overlap or touch.
+    Returns a sorted list of disjoint ranges.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(day_range) for day_range in merged]
+
+def get_reserved_ranges(vehicle_id, extra_ranges=()):
+    """
+    Returns the vehicle's blocked dates from today onwards as merged
+    [start, end] YYYY-MM-DD pairs for the booking calendar. The database
+    part is cached per vehicle until a reservation changes or the day rolls
+    over; extra_ranges (e.g. the user's cart) are merged in on top.
+    """
+    today = today_day_number()
+    key = (int(vehicle_id), get_reservations_version(), today)
+    reserved = calendar_cache.get(key)
+    if reserved is None:
+        reserved = merge_day_ranges(get_reserved_days(vehicle_id, today))
+        calendar_cache.put(key, reserved)
+    ranges = merge_day_ranges(list(reserved) + [day_range for day_range in extra_ranges if day_range[1] >= today])
+    return [[from_day_number(start), from_day_number(end)] for start, end in ranges]
+
 # ---------------------- Authentication and User Management ----------------------
 
 def login_user(email, password):
@@ -177,7 +224,7 @@ def login_user(email, password):
             session["Username"] = data[9]
             session["DLPhotos"] = data[11]
             session["Usertype"] = data[12]
-            session["reservedCars"] = ""
+            session["CartID"] = secrets.token_hex(16)
             
             # Log user type to console
             if data[12] == 0:
@@ -219,27 +266,33 @@ def get_price_by_vehicleid(vehicleID, numDays):
 
 # ---------------------- Reservation Operations ----------------------
 
-def GetCheckoutValues(reservedCars):
+def get_cart_vehicles(cart_items):
     """
-    Calculates checkout totals and generates HTML for selected vehicles.
+    Resolves every vehicle in the cart with one lookup.
+    Returns {VehicleID: vehicle row}.
+    """
+    return get_vehicles_by_ids([item.vehicle_id for item in cart_items])
+
+def GetCheckoutValues(cart_items, vehicles=None):
+    """
+    Calculates checkout totals from the precomputed line totals and
+    generates the per-type rate HTML for the cart.
     """
     total = 0
     checkout_html = ""
     totalData = []
     types = []
-    for car in reservedCars:
-        car = car.strip().split(",")
-        if len(car) == 3:
-            vehicle = get_vehicle_by_id(car[0])
+    vehicles = get_cart_vehicles(cart_items) if vehicles is None else vehicles
+    for item in cart_items:
+        total += item.line_total
+        vehicle = vehicles.get(item.vehicle_id)
+        if vehicle and vehicle[4] not in types:
             rate = get_rates_by_vehicle_type(vehicle[4])[0]
-            numDays = getNumDays(car[1]) + 1
-            total += numDays * rate[3]
-            if vehicle[4] not in types:
-                types.append(vehicle[4])
-                checkout_html += Markup(
-                    """<li class="d-flex justify-content-between py-3 border-bottom">
+            types.append(vehicle[4])
+            checkout_html += Markup(
+                """<li class="d-flex justify-content-between py-3 border-bottom">
                        <strong class="text-muted">{type} Rate </strong><strong>${rate:.2f}/day</strong></li>"""
-                ).format(rate=rate[3], type=vehicle[4])
+            ).format(rate=rate[3], type=vehicle[4])
     totalData.append(f"{total + 30.00:.2f}")
     totalData.append(f"{float(totalData[0]) * 0.07:.2f}")
     totalData.append(f"{float(totalData[0]) + float(totalData[1]):.2f}")
@@ -276,7 +329,7 @@ def generate_pickupdropoff_html(reservationsTableData):
                 <td class="text-truncate" style="max-width: 200px;">{ReserveStartDate}</td>
                 <td class="text-truncate" style="max-width: 200px;">{ReserveEndDate}</td>
                 <td class="text-center">
-                    <button data-bs-target="#modal-{ReservationID}" type="button" data-bs-toggle="modal" 
+                    <button data-reservation-id="{ReservationID}" data-modal-url="/reservation/{ReservationID}/modal" type="button" 
                             style="border:none; background: none;">
                         <svg xmlns="http://www.w3.org/2000/svg" width="1em" height="1em" fill="currentColor" 
                              viewBox="0 0 16 16" class="bi bi-eye-fill fs-5 text-primary">
@@ -297,11 +350,26 @@ def generate_pickupdropoff_html(reservationsTableData):
         )
     return html
 
-def pickup_modal_html(ReservationID):
-    reservation_data = get_reservation_by_id(ReservationID)
-    vehicle_data = get_vehicle_by_id(reservation_data[1])
-    pickuploc = get_location_by_id(reservation_data[10])[1]
-    dropoffloc = get_location_by_id(reservation_data[11])[1]
+def generate_pager_html(newest_url, older_url):
+    """
+    Generates Newest/Older links for a keyset-paginated table footer.
+    """
+    pager_html = ""
+    if newest_url:
+        pager_html += Markup(
+            """<a class="btn btn-outline-primary btn-sm" href="{url}" style="margin-right: 10px;">Newest</a>"""
+        ).format(url=newest_url)
+    if older_url:
+        pager_html += Markup(
+            """<a class="btn btn-outline-primary btn-sm" href="{url}">Older</a>"""
+        ).format(url=older_url)
+    return pager_html
+
+def pickup_modal_html(reservation):
+    """
+    Generates the pickup modal from a get_reservations_tableData/get_customer_tableData row.
+    """
+    ReservationID = reservation[0]
     pickup_html = Markup("""
         <div class="modal fade" role="dialog" tabindex="-1" id="modal-{ReservationID}">
             <div class="modal-dialog modal-xl" role="document">
@@ -328,10 +396,10 @@ def pickup_modal_html(ReservationID):
                                     <p>End Date:&nbsp;{ReservationEnd}</p>
                                     <p>Pickup Location:&nbsp;{pickuploc}</p>
                                     <p>Drop Off Location:&nbsp;{dropoffloc}</p>
-                                    <p style="margin-bottom: 30px;">Estimated Total:&nbsp;{estTotal}</p>""").format(Make=vehicle_data[1], Model=vehicle_data[2], Year=vehicle_data[3], Type=vehicle_data[4], Mileage=vehicle_data[5], Trans=vehicle_data[6], Drive=vehicle_data[15], 
-                                          ReservationID=ReservationID, ReservationStart=reservation_data[6], ReservationEnd=reservation_data[7], estTotal="%0.2f" % (reservation_data[15]), pickuploc=pickuploc, dropoffloc=dropoffloc)
+                                    <p style="margin-bottom: 30px;">Estimated Total:&nbsp;{estTotal}</p>""").format(Make=reservation[8], Model=reservation[9], Year=reservation[10], Type=reservation[11], Mileage=reservation[12], Trans=reservation[13], Drive=reservation[14], 
+                                          ReservationID=ReservationID, ReservationStart=reservation[2], ReservationEnd=reservation[3], estTotal="%0.2f" % (reservation[17]), pickuploc=reservation[15], dropoffloc=reservation[16])
                                     
-    if reservation_data[4] == "False":                                
+    if reservation[18] == "False":                                
         pickup_html += Markup("""<p>Signed Rental Agreement Status:&nbsp;<label style="color: Red; font-size: 2rem;">&nbsp;&nbsp;Not Signed</label></p>
                               </div>
                             </div>
@@ -364,12 +432,12 @@ def pickup_modal_html(ReservationID):
     return pickup_html
 
 
-def dropoff_modal_html(ReservationID):
-    reservation_data = get_reservation_by_id(ReservationID)
-    vehicle_data = get_vehicle_by_id(reservation_data[1])
-    paymentStatus = get_payment_status(ReservationID)
-    pickuploc = get_location_by_id(reservation_data[10])[1]
-    dropoffloc = get_location_by_id(reservation_data[11])[1]
+def dropoff_modal_html(reservation):
+    """
+    Generates the drop-off modal from a get_reservations_tableData/get_customer_tableData row.
+    """
+    ReservationID = reservation[0]
+    paymentStatus = reservation[19]
     
     dropoff_html = Markup("""<div class="modal fade" role="dialog" tabindex="-1" id="modal-{ReservationID}">
             <div class="modal-dialog modal-xl" role="document">
@@ -398,8 +466,8 @@ def dropoff_modal_html(ReservationID):
                                     <p>Drop Off Location:&nbsp;{dropoffloc}</p>
                                     <p style="margin-bottom: 60px;">Estimated Total:&nbsp;{estTotal}</p>
                                     <p>Payment Status:&nbsp;{paymentStatus}
-                                """).format(Make=vehicle_data[1], Model=vehicle_data[2], Year=vehicle_data[3], Type=vehicle_data[4], Mileage=vehicle_data[5], Trans=vehicle_data[6], Drive=vehicle_data[15], 
-                                          ReservationID=ReservationID, ReservationStart=reservation_data[6], ReservationEnd=reservation_data[7], estTotal="%0.2f" % (reservation_data[15]), paymentStatus=paymentStatus, pickuploc=pickuploc, dropoffloc=dropoffloc)
+                                """).format(Make=reservation[8], Model=reservation[9], Year=reservation[10], Type=reservation[11], Mileage=reservation[12], Trans=reservation[13], Drive=reservation[14], 
+                                          ReservationID=ReservationID, ReservationStart=reservation[2], ReservationEnd=reservation[3], estTotal="%0.2f" % (reservation[17]), paymentStatus=paymentStatus, pickuploc=reservation[15], dropoffloc=reservation[16])
                         
     if paymentStatus == "none" or paymentStatus == "Partial":
         dropoff_html += Markup("""&nbsp;&nbsp;{AmountPaid}</p>
@@ -415,7 +483,7 @@ def dropoff_modal_html(ReservationID):
                     </div>
                 </div>
             </div>
-        </div>""").format(ReservationID=ReservationID, AmountPaid= f"Amount Paid: ${float(get_invoice_PaidAmount(ReservationID)):.2f}  Remaining: ${float(reservation_data[15]) - float(get_invoice_PaidAmount(ReservationID)):.2f}")
+        </div>""").format(ReservationID=ReservationID, AmountPaid= f"Amount Paid: ${float(reservation[20]):.2f}  Remaining: ${float(reservation[17]) - float(reservation[20]):.2f}")
     else:
         dropoff_html += Markup("""</p>
                                 </div>